@@ -6,10 +6,95 @@ Recebe mensagens da ESP32 via Serial USB e envia respostas simples
 Para testar a comunicação básica entre as duas placas
 """
 
+import asyncio
 import serial
+import threading
 import time
 import sys
 
+def ler_serial(serial_connection, loop, fila_rx):
+    """
+    Thread dedicada à leitura da ESP32
+    
+    Bloqueia no driver até chegarem bytes (sem timeout, sem acordar à toa) e
+    entrega as linhas completas ao event loop. Ao terminar, entrega a exceção
+    que encerrou a leitura, para o event loop não esperar para sempre.
+    """
+    buffer_rx = bytearray()  # Bytes recebidos que ainda não formam uma linha completa
+    erro = serial.SerialException("Porta serial fechada")
+    
+    while serial_connection.is_open:
+        try:
+            # Primeiro byte bloqueante e, em seguida, tudo que já está no buffer do driver
+            buffer_rx += serial_connection.read(serial_connection.in_waiting or 1)
+        except serial.SerialException as e:
+            erro = e
+            break
+        
+        while b'\n' in buffer_rx:
+            dados, _, buffer_rx = buffer_rx.partition(b'\n')
+            linha = dados.decode('utf-8', errors='replace').strip()
+            if linha:
+                loop.call_soon_threadsafe(fila_rx.put_nowait, linha)
+    
+    try:
+        loop.call_soon_threadsafe(fila_rx.put_nowait, erro)
+    except RuntimeError:
+        pass  # Event loop já encerrado
+
+async def responder(fila_rx, saida, saida_pronta):
+    """Processa as linhas recebidas e enfileira as respostas para a ESP32"""
+    contador_respostas = 0
+    
+    while True:
+        linha = await fila_rx.get()
+        if isinstance(linha, Exception):
+            raise linha  # Leitura interrompida (ex.: ESP32 desconectada)
+        print(f"📥 RECEBIDO: {linha}")
+        
+        # Se for uma mensagem da ESP32, enfileirar resposta
+        if linha.startswith("ESP32_MSG:"):
+            contador_respostas += 1
+            resposta = f"RASP_RESPOSTA:{contador_respostas}:Ola da Raspberry Pi!"
+            saida += (resposta + '\n').encode('utf-8')
+            saida_pronta.set()
+            print(f"📤 ENVIADO: {resposta}")
+            print("-" * 50)
+
+async def enviar_serial(serial_connection, saida, saida_pronta):
+    """Agrupa as respostas pendentes e as envia em uma única escrita por ciclo"""
+    while True:
+        await saida_pronta.wait()
+        
+        # Ceder um ciclo do event loop para que as demais respostas do lote entrem
+        await asyncio.sleep(0)
+        saida_pronta.clear()
+        
+        dados = bytes(saida)
+        saida.clear()
+        try:
+            serial_connection.write(dados)
+        except serial.SerialTimeoutException:
+            print("⚠️  Timeout ao enviar dados para a ESP32")
+
+async def executar_teste(serial_connection):
+    """Executa resposta e envio no event loop, com a leitura em uma thread dedicada"""
+    fila_rx = asyncio.Queue()
+    saida = bytearray()  # Respostas aguardando envio
+    saida_pronta = asyncio.Event()
+    
+    leitor = threading.Thread(
+        target=ler_serial,
+        args=(serial_connection, asyncio.get_running_loop(), fila_rx),
+        daemon=True
+    )
+    leitor.start()
+    
+    await asyncio.gather(
+        responder(fila_rx, saida, saida_pronta),
+        enviar_serial(serial_connection, saida, saida_pronta)
+    )
+
 def main():
     # Configurações da conexão serial
     # No Windows, geralmente será algo como 'COM3', 'COM4', etc.
@@ -28,7 +113,8 @@ def main():
             serial_connection = serial.Serial(
                 port=port,
                 baudrate=115200,
-                timeout=1
+                timeout=None,  # Leitura totalmente bloqueante (thread dedicada)
+                write_timeout=0.05  # Não travar o envio se a ESP32 parar de ler
             )
             time.sleep(2)  # Aguardar inicialização
             print(f"✅ Conectado com sucesso na porta: {port}")
@@ -46,30 +132,8 @@ def main():
     print("📡 Aguardando mensagens da ESP32...")
     print("Press Ctrl+C para parar\n")
     
-    contador_respostas = 0
-    
     try:
-        while True:
-            # Verificar se há dados disponíveis
-            if serial_connection.in_waiting > 0:
-                # Ler linha da ESP32
-                linha = serial_connection.readline().decode('utf-8').strip()
-                
-                if linha:
-                    print(f"📥 RECEBIDO: {linha}")
-                    
-                    # Se for uma mensagem da ESP32, enviar resposta
-                    if linha.startswith("ESP32_MSG:"):
-                        contador_respostas += 1
-                        resposta = f"RASP_RESPOSTA:{contador_respostas}:Ola da Raspberry Pi!"
-                        
-                        # Enviar resposta
-                        serial_connection.write((resposta + '\n').encode('utf-8'))
-                        print(f"📤 ENVIADO: {resposta}")
-                        print("-" * 50)
-            
-            time.sleep(0.1)  # Pequena pausa para não sobrecarregar o CPU
-            
+        asyncio.run(executar_teste(serial_connection))
     except KeyboardInterrupt:
         print("\n\n⏹️  Teste interrompido pelo usuário")
     except Exception as e:
@@ -62,6 +62,7 @@ void readAllSensors();
 void sendJsonMessage(String type, String data);
 void receiveSerialData();
 void processReceivedJson(String jsonData);
+void processJsonMessage(JsonObject doc);
 void initializeBoardValidation();
 void handlePlayerMove();
 void handleAIMove();
@@ -246,7 +247,7 @@ void receiveSerialData() {
 }
 
 void processReceivedJson(String jsonData) {
-  DynamicJsonDocument doc(1024);
+  DynamicJsonDocument doc(2048);
   DeserializationError error = deserializeJson(doc, jsonData);
   
   if (error) {
@@ -254,20 +255,47 @@ void processReceivedJson(String jsonData) {
     return;
   }
   
+  // A Raspberry pode agrupar várias mensagens em um único quadro (array JSON)
+  if (doc.is<JsonArray>()) {
+    for (JsonObject message : doc.as<JsonArray>()) {
+      processJsonMessage(message);
+    }
+  } else {
+    processJsonMessage(doc.as<JsonObject>());
+  }
+}
+
+void processJsonMessage(JsonObject doc) {
   String type = doc["type"];
   
   if (type == "board_matrix") {
-    // Receber matriz inicial do tabuleiro
-    JsonArray matrix = doc["matrix"];
+    // Receber ocupação inicial do tabuleiro: bitboard em hexadecimal (bit 0 = A1, bit 63 = H8)
+    const char* occHex = doc["occ"];
+    uint64_t occ = strtoull(occHex ? occHex : "0", NULL, 16);
     
     for (int row = 0; row < BOARD_SIZE; row++) {
+      // Linha 0 da matriz é a fileira 8
+      int rank = BOARD_SIZE - 1 - row;
       for (int col = 0; col < BOARD_SIZE; col++) {
-        boardMatrix[row][col] = matrix[row * BOARD_SIZE + col];
+        boardMatrix[row][col] = (occ >> (rank * BOARD_SIZE + col)) & 1;
       }
     }
     
     initializeBoardValidation();
     
+  } else if (type == "board_delta") {
+    // Atualizar só as casas que mudaram (inclui capturas, roque e en passant)
+    const char* deltaHex = doc["delta"];
+    const char* occHex = doc["occ"];
+    uint64_t delta = strtoull(deltaHex ? deltaHex : "0", NULL, 16);
+    uint64_t occ = strtoull(occHex ? occHex : "0", NULL, 16);
+    
+    while (delta) {
+      int bit = __builtin_ctzll(delta);
+      delta &= delta - 1;
+      boardMatrix[BOARD_SIZE - 1 - bit / BOARD_SIZE][bit % BOARD_SIZE] = (occ >> bit) & 1;
+    }
+    
   } else if (type == "move_options") {
     // Receber opções de movimento
     String bestMove = doc["best_move"];
@@ -1,5 +1,7 @@
+from functools import lru_cache
 from fpdf import FPDF
 
+@lru_cache(maxsize=None)
 def tratar_texto(texto):
     return texto.encode("latin-1", "replace").decode("latin-1")
 
@@ -67,14 +69,17 @@ Observações:
 
 """
 
-pdf = FPDF()
-pdf.add_page()
-pdf.set_auto_page_break(auto=True, margin=15)
-pdf.set_font("Arial", size=12)
+def gerar_pdf(caminho_pdf):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("Arial", size=12)
 
-for linha in tratar_texto(texto).split("\n"):
-    pdf.multi_cell(0, 10, linha)
+    # multi_cell já trata as quebras de linha do texto
+    pdf.multi_cell(0, 10, tratar_texto(texto))
 
-caminho_pdf = "./ChessAI_Fluxo_Projeto.pdf"
-pdf.output(caminho_pdf)
-caminho_pdf
\ No newline at end of file
+    pdf.output(caminho_pdf)
+    return caminho_pdf
+
+if __name__ == "__main__":
+    gerar_pdf("./ChessAI_Fluxo_Projeto.pdf")
@@ -4,10 +4,42 @@ ChessAI - Utilities
 Utilitários auxiliares para o sistema ChessAI
 """
 
+import re
 import json
 import time
+import random
+import functools
 import chess
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional, Union
+
+# orjson é opcional: quando instalado, decodifica as mensagens recebidas mais rápido
+try:
+    import orjson
+    
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Tabelas pré-calculadas de conversão entre casas e coordenadas (row, col)
+# row=0 corresponde à linha 8 do tabuleiro, col=0 à coluna A
+RC_TO_SQUARE = [[f"{chr(ord('A') + col)}{8 - row}" for col in range(8)] for row in range(8)]
+SQUARE_TO_RC = {RC_TO_SQUARE[row][col]: (row, col) for row in range(8) for col in range(8)}
+
+# Movimento no formato UCI (ex: e2e4, E7E8Q)
+MOVE_PATTERN = re.compile(r'[A-Ha-h][1-8][A-Ha-h][1-8][qrbnQRBN]?')
+
+# Ocupação de uma fileira (colunas A-H) para cada valor possível de um byte do bitboard
+BYTE_TO_ROW = [tuple((byte >> file) & 1 for file in range(8)) for byte in range(256)]
+
+def occupancy_to_matrix(occupied: int) -> List[List[int]]:
+    """
+    Converte o bitboard de ocupação (bit 0 = A1, bit 63 = H8) em matriz 8x8
+    
+    Returns:
+        Matriz onde a linha 0 é a fileira 8; 1 = peça presente, 0 = casa vazia
+    """
+    # to_bytes separa as 8 fileiras em C; big-endian já começa pela fileira 8
+    return [list(BYTE_TO_ROW[byte]) for byte in occupied.to_bytes(8, 'big')]
 
 class ChessNotationConverter:
     """Conversor entre diferentes notações de xadrez"""
@@ -22,10 +54,14 @@ class ChessNotationConverter:
             
         Returns:
             Tupla (row, col) onde row=0-7, col=0-7
+            
+        Raises:
+            ValueError: Se a casa não existir no tabuleiro
         """
-        col = ord(square_name[0].upper()) - ord('A')
-        row = 8 - int(square_name[1])
-        return (row, col)
+        try:
+            return SQUARE_TO_RC[square_name[:2].upper()]
+        except KeyError:
+            raise ValueError(f"Casa inválida: {square_name!r}") from None
     
     @staticmethod
     def coordinates_to_square(row: int, col: int) -> str:
@@ -39,9 +75,7 @@ class ChessNotationConverter:
         Returns:
             Nome da casa (ex: "A1", "H8")
         """
-        file = chr(ord('A') + col)
-        rank = str(8 - row)
-        return file + rank
+        return RC_TO_SQUARE[row][col]
     
     @staticmethod
     def uci_to_readable(uci_move: str) -> str:
@@ -60,12 +94,34 @@ class ChessNotationConverter:
             return f"{from_square}-{to_square}"
         return uci_move.upper()
 
+@functools.lru_cache(maxsize=1024)
+def parse_uci_move(move_uci: str) -> chess.Move:
+    """Converte movimento UCI em chess.Move (resultado em cache)"""
+    return chess.Move.from_uci(move_uci)
+
+@functools.lru_cache(maxsize=128)
+def parse_square_name(square_name: str) -> int:
+    """Converte nome de casa ('E2' ou 'e2') no índice do python-chess (resultado em cache)"""
+    return chess.parse_square(square_name.lower())
+
 class BoardStateManager:
     """Gerenciador de estado do tabuleiro"""
     
     def __init__(self):
         self.current_state = chess.Board()
         self.move_history = []
+        self._legal_uci_cache = None  # Movimentos legais da posição atual (UCI)
+    
+    def get_legal_moves_uci(self) -> set:
+        """
+        Obtém os movimentos legais da posição atual em formato UCI
+        
+        Returns:
+            Conjunto de movimentos UCI, calculado uma vez por posição
+        """
+        if self._legal_uci_cache is None:
+            self._legal_uci_cache = {move.uci() for move in self.current_state.legal_moves}
+        return self._legal_uci_cache
     
     def update_board(self, move_uci: str) -> bool:
         """
@@ -77,15 +133,13 @@ class BoardStateManager:
         Returns:
             True se o movimento foi válido e executado
         """
-        try:
-            move = chess.Move.from_uci(move_uci)
-            if move in self.current_state.legal_moves:
-                self.current_state.push(move)
-                self.move_history.append(move_uci)
-                return True
-            return False
-        except ValueError:
+        if move_uci not in self.get_legal_moves_uci():
             return False
+        
+        self.current_state.push(parse_uci_move(move_uci))
+        self.move_history.append(move_uci)
+        self._legal_uci_cache = None
+        return True
     
     def undo_last_move(self) -> bool:
         """
@@ -98,9 +152,10 @@ class BoardStateManager:
             if self.move_history:
                 self.current_state.pop()
                 self.move_history.pop()
+                self._legal_uci_cache = None
                 return True
             return False
-        except:
+        except IndexError:
             return False
     
     def get_board_matrix(self) -> List[List[int]]:
@@ -110,15 +165,16 @@ class BoardStateManager:
         Returns:
             Matriz onde 1 = peça presente, 0 = casa vazia
         """
-        matrix = []
-        for rank in range(8, 0, -1):
-            row = []
-            for file in range(8):
-                square = chess.square(file, rank - 1)
-                piece = self.current_state.piece_at(square)
-                row.append(1 if piece else 0)
-            matrix.append(row)
-        return matrix
+        return occupancy_to_matrix(self.current_state.occupied)
+    
+    def get_board_occupancy(self) -> int:
+        """
+        Obtém o bitboard de ocupação do tabuleiro atual
+        
+        Returns:
+            Inteiro de 64 bits (bit 0 = A1, bit 63 = H8) com 1 onde há peça
+        """
+        return self.current_state.occupied
     
     def get_piece_positions(self) -> Dict[str, List[str]]:
         """
@@ -144,22 +200,54 @@ class BoardStateManager:
             "black": black_pieces
         }
 
+# Tipos de mensagem do protocolo
+MSG_GAME_START = 'game_start'
+MSG_BOARD_MATRIX = 'board_matrix'
+MSG_PLAYER_MOVE = 'player_move'
+MSG_PLAYER_MOVE_COMPLETE = 'player_move_complete'
+MSG_MOVE_OPTIONS = 'move_options'
+MSG_AI_MOVE = 'ai_move'
+MSG_AI_MOVE_CONFIRMED = 'ai_move_confirmed'
+MSG_ERROR = 'error'
+MSG_STATUS = 'status'
+MSG_BOARD_DELTA = 'board_delta'
+
 class CommunicationProtocol:
     """Protocolo de comunicação entre ESP32 e Raspberry Pi"""
     
     # Tipos de mensagem
     MESSAGE_TYPES = {
-        'GAME_START': 'game_start',
-        'BOARD_MATRIX': 'board_matrix',
-        'PLAYER_MOVE': 'player_move',
-        'PLAYER_MOVE_COMPLETE': 'player_move_complete',
-        'MOVE_OPTIONS': 'move_options',
-        'AI_MOVE': 'ai_move',
-        'AI_MOVE_CONFIRMED': 'ai_move_confirmed',
-        'ERROR': 'error',
-        'STATUS': 'status'
+        'GAME_START': MSG_GAME_START,
+        'BOARD_MATRIX': MSG_BOARD_MATRIX,
+        'PLAYER_MOVE': MSG_PLAYER_MOVE,
+        'PLAYER_MOVE_COMPLETE': MSG_PLAYER_MOVE_COMPLETE,
+        'MOVE_OPTIONS': MSG_MOVE_OPTIONS,
+        'AI_MOVE': MSG_AI_MOVE,
+        'AI_MOVE_CONFIRMED': MSG_AI_MOVE_CONFIRMED,
+        'ERROR': MSG_ERROR,
+        'STATUS': MSG_STATUS,
+        'BOARD_DELTA': MSG_BOARD_DELTA
+    }
+    
+    # Início pré-serializado de cada tipo de mensagem (até o valor do timestamp)
+    MESSAGE_HEADERS = {
+        msg_type: f'{{"type": {json.dumps(msg_type)}, "timestamp": '
+        for msg_type in MESSAGE_TYPES.values()
     }
     
+    @staticmethod
+    def create_static_message(msg_type: str) -> str:
+        """
+        Cria mensagem sem dados além do tipo e do timestamp
+        
+        Args:
+            msg_type: Tipo da mensagem (um dos valores de MESSAGE_TYPES)
+            
+        Returns:
+            String JSON formatada
+        """
+        return CommunicationProtocol.MESSAGE_HEADERS[msg_type] + f'{int(time.time())}}}'
+    
     @staticmethod
     def create_message(msg_type: str, data: Dict) -> str:
         """
@@ -172,99 +260,193 @@ class CommunicationProtocol:
         Returns:
             String JSON formatada
         """
-        message = {
-            'type': msg_type,
-            'timestamp': int(time.time()),
-            **data
-        }
-        return json.dumps(message)
+        timestamp = int(time.time())
+        if 'type' in data or 'timestamp' in data:
+            return json.dumps({'type': msg_type, 'timestamp': timestamp, **data})
+        
+        header = CommunicationProtocol.MESSAGE_HEADERS.get(msg_type)
+        if header is None:
+            header = f'{{"type": {json.dumps(msg_type)}, "timestamp": '
+        
+        if not data:
+            return f'{header}{timestamp}}}'
+        
+        # Só o payload é serializado; o cabeçalho já vem pronto
+        return f'{header}{timestamp}, {json.dumps(data)[1:-1]}}}'
     
     @staticmethod
-    def parse_message(json_str: str) -> Optional[Dict]:
+    def parse_message(json_str: Union[str, bytes]) -> Optional[Dict]:
         """
         Processa mensagem JSON recebida
         
         Args:
-            json_str: String JSON
+            json_str: String JSON, ou os bytes UTF-8 lidos da serial
             
         Returns:
             Dicionário com dados da mensagem ou None se inválida
         """
         try:
-            return json.loads(json_str.strip())
+            return json_loads(json_str.strip())
         except json.JSONDecodeError:
             return None
     
     @staticmethod
-    def create_board_matrix_message(matrix: List[List[int]]) -> str:
-        """Cria mensagem com matriz do tabuleiro"""
-        flat_matrix = [cell for row in matrix for cell in row]
+    def create_batch(messages: List[str]) -> str:
+        """
+        Agrupa várias mensagens JSON em um único quadro (array JSON)
+        
+        Args:
+            messages: Mensagens já serializadas por create_message
+            
+        Returns:
+            String JSON com o array de mensagens (ou a própria mensagem, se única)
+        """
+        if len(messages) == 1:
+            return messages[0]
+        return '[' + ','.join(messages) + ']'
+    
+    @staticmethod
+    def parse_messages(json_str: Union[str, bytes]) -> List[Dict]:
+        """
+        Processa um quadro recebido, que pode conter uma mensagem ou um lote
+        
+        Args:
+            json_str: String JSON ou bytes UTF-8 (objeto ou array de objetos)
+            
+        Returns:
+            Lista de mensagens (vazia se o quadro for inválido)
+        """
+        data = CommunicationProtocol.parse_message(json_str)
+        if isinstance(data, list):
+            return [message for message in data if isinstance(message, dict)]
+        if isinstance(data, dict):
+            return [data]
+        return []
+    
+    @staticmethod
+    def create_board_matrix_message(occupied: int) -> str:
+        """Cria mensagem com a ocupação do tabuleiro (bitboard em 16 dígitos hexadecimais)"""
         return CommunicationProtocol.create_message(
-            CommunicationProtocol.MESSAGE_TYPES['BOARD_MATRIX'],
-            {'matrix': flat_matrix}
+            MSG_BOARD_MATRIX,
+            {'occ': f'{occupied:016x}'}
         )
     
     @staticmethod
     def create_move_options_message(best_move: str, alternatives: List[str]) -> str:
         """Cria mensagem com opções de movimento"""
         return CommunicationProtocol.create_message(
-            CommunicationProtocol.MESSAGE_TYPES['MOVE_OPTIONS'],
+            MSG_MOVE_OPTIONS,
             {
                 'best_move': best_move,
                 'alternatives': alternatives
             }
         )
     
+    @staticmethod
+    def create_board_delta_message(previous: int, occupied: int) -> str:
+        """Cria mensagem com as casas alteradas (XOR dos bitboards) e a nova ocupação"""
+        return CommunicationProtocol.create_message(
+            MSG_BOARD_DELTA,
+            {'delta': f'{previous ^ occupied:016x}', 'occ': f'{occupied:016x}'}
+        )
+    
     @staticmethod
     def create_ai_move_message(from_square: str, to_square: str) -> str:
         """Cria mensagem com movimento da IA"""
         return CommunicationProtocol.create_message(
-            CommunicationProtocol.MESSAGE_TYPES['AI_MOVE'],
+            MSG_AI_MOVE,
             {
                 'from': from_square,
                 'to': to_square
             }
         )
 
+# Códigos numéricos das cores dos LEDs (um byte por casa)
+COLOR_CODES = {
+    'off': 0,
+    'green': 1,
+    'yellow': 2,
+    'blue_solid': 3,
+    'blue_blink': 4,
+    'red': 5
+}
+COLOR_NAMES = {code: name for name, code in COLOR_CODES.items()}
+
+# Gerador de números aleatórios reutilizado pelas simulações de sensores
+_sensor_rng = random.Random()
+
 class LEDController:
     """Controlador virtual de LEDs para testes"""
     
     def __init__(self):
-        self.led_states = {}
-        for row in range(8):
-            for col in range(8):
-                self.led_states[(row, col)] = 'off'
+        # Estado de cada LED indexado por row * 8 + col
+        self.led_states = bytearray(64)
     
     def set_led(self, row: int, col: int, color: str) -> None:
-        """Define cor de um LED"""
+        """Define cor de um LED
+        
+        Raises:
+            ValueError: Se a cor não estiver em COLOR_CODES
+        """
+        code = COLOR_CODES.get(color)
+        if code is None:
+            raise ValueError(f"Cor inválida: {color!r} (válidas: {', '.join(COLOR_CODES)})")
         if 0 <= row < 8 and 0 <= col < 8:
-            self.led_states[(row, col)] = color
+            self.led_states[row * 8 + col] = code
             square = ChessNotationConverter.coordinates_to_square(row, col)
             print(f"LED {square} -> {color.upper()}")
     
+    def get_led(self, row: int, col: int) -> str:
+        """Obtém cor atual de um LED"""
+        return COLOR_NAMES[self.led_states[row * 8 + col]]
+    
+    def get_led_bytes(self) -> bytes:
+        """Obtém o estado dos 64 LEDs como bytes (um código de cor por casa)"""
+        return bytes(self.led_states)
+    
     def clear_all(self) -> None:
         """Apaga todos os LEDs"""
-        for row in range(8):
-            for col in range(8):
-                self.led_states[(row, col)] = 'off'
+        self.led_states[:] = bytes(64)
         print("Todos os LEDs apagados")
     
-    def show_move_options(self, best_move: str, alternatives: List[str]) -> None:
-        """Mostra opções de movimento nos LEDs"""
-        self.clear_all()
+    def apply_states(self, new_states: bytearray) -> bytes:
+        """
+        Aplica um novo estado completo aos LEDs, atualizando apenas os que mudaram
+        
+        Args:
+            new_states: Códigos de cor das 64 casas (índice row * 8 + col)
+            
+        Returns:
+            Mudanças codificadas como pares de bytes (índice, código de cor)
+        """
+        changes = bytearray()
+        for index in range(64):
+            color = new_states[index]
+            if color != self.led_states[index]:
+                changes += bytes((index, color))
+                square = RC_TO_SQUARE[index >> 3][index & 7]
+                print(f"LED {square} -> {COLOR_NAMES[color].upper()}")
+        
+        self.led_states[:] = new_states
+        return bytes(changes)
+    
+    def show_move_options(self, best_move: str, alternatives: List[str]) -> bytes:
+        """Mostra opções de movimento nos LEDs e retorna as mudanças aplicadas"""
+        new_states = bytearray(64)
         
         # Melhor movimento em verde
         if len(best_move) >= 4:
-            to_square = best_move[2:4].upper()
-            row, col = ChessNotationConverter.square_to_coordinates(to_square)
-            self.set_led(row, col, 'green')
+            row, col = ChessNotationConverter.square_to_coordinates(best_move[2:4])
+            new_states[row * 8 + col] = COLOR_CODES['green']
         
-        # Alternativas em amarelo
+        # Alternativas em amarelo (sem sobrescrever o melhor movimento)
         for alt_move in alternatives:
             if len(alt_move) >= 4:
-                to_square = alt_move[2:4].upper()
-                row, col = ChessNotationConverter.square_to_coordinates(to_square)
-                self.set_led(row, col, 'yellow')
+                row, col = ChessNotationConverter.square_to_coordinates(alt_move[2:4])
+                if not new_states[row * 8 + col]:
+                    new_states[row * 8 + col] = COLOR_CODES['yellow']
+        
+        return self.apply_states(new_states)
     
     def show_ai_move(self, from_square: str, to_square: str) -> None:
         """Mostra movimento da IA"""
@@ -274,31 +456,21 @@ class LEDController:
         self.set_led(from_row, from_col, 'blue_solid')
         self.set_led(to_row, to_col, 'blue_blink')
 
+# Valores aceitos em cada casa da matriz de ocupação
+VALID_CELL_VALUES = frozenset((0, 1))
+
 class GameValidator:
     """Validador de regras e movimentos do jogo"""
     
     @staticmethod
     def is_valid_square(square_name: str) -> bool:
         """Verifica se uma notação de casa é válida"""
-        if len(square_name) != 2:
-            return False
-        
-        file = square_name[0].upper()
-        rank = square_name[1]
-        
-        return 'A' <= file <= 'H' and '1' <= rank <= '8'
+        return square_name.upper() in SQUARE_TO_RC
     
     @staticmethod
     def is_valid_move_format(move_str: str) -> bool:
-        """Verifica se um movimento está no formato correto"""
-        if len(move_str) < 4:
-            return False
-        
-        from_square = move_str[:2]
-        to_square = move_str[2:4]
-        
-        return (GameValidator.is_valid_square(from_square) and 
-                GameValidator.is_valid_square(to_square))
+        """Verifica se um movimento está no formato correto (UCI, com promoção opcional)"""
+        return MOVE_PATTERN.fullmatch(move_str) is not None
     
     @staticmethod
     def validate_board_setup(matrix: List[List[int]]) -> Tuple[bool, str]:
@@ -318,12 +490,14 @@ class GameValidator:
             if len(row) != 8:
                 return False, f"Linha {i+1} deve ter 8 colunas"
             
-            for j, cell in enumerate(row):
-                if cell not in [0, 1]:
-                    return False, f"Célula ({i+1},{j+1}) deve ser 0 ou 1"
+            # Caminho rápido: a linha inteira é verificada em uma operação de conjunto;
+            # a célula inválida só é procurada quando há erro
+            if not VALID_CELL_VALUES.issuperset(row):
+                j = next(j for j, cell in enumerate(row) if cell not in VALID_CELL_VALUES)
+                return False, f"Célula ({i+1},{j+1}) deve ser 0 ou 1"
         
         # Verificar número de peças (deve ser 32 no início)
-        total_pieces = sum(sum(row) for row in matrix)
+        total_pieces = sum(map(sum, matrix))
         if total_pieces != 32:
             return False, f"Número incorreto de peças: {total_pieces} (esperado: 32)"
         
@@ -363,26 +537,37 @@ class TestUtilities:
         Returns:
             Matriz com valores simulados de sensores
         """
-        import random
-        
-        sensor_matrix = []
-        for row in matrix:
-            sensor_row = []
-            for cell in row:
-                # Simular valores de sensor (0-1023 para ADC de 10 bits)
-                if cell == 1:  # Peça presente
-                    base_value = 800
-                    noise = random.randint(-int(noise_level * 200), int(noise_level * 200))
-                    sensor_value = max(0, min(1023, base_value + noise))
-                else:  # Casa vazia
-                    base_value = 200
-                    noise = random.randint(-int(noise_level * 100), int(noise_level * 100))
-                    sensor_value = max(0, min(1023, base_value + noise))
-                
-                sensor_row.append(sensor_value)
-            sensor_matrix.append(sensor_row)
-        
-        return sensor_matrix
+        return next(TestUtilities.simulate_sensor_frames(matrix, 1, noise_level))
+    
+    @staticmethod
+    def simulate_sensor_frames(matrix: List[List[int]], frames: int,
+                               noise_level: float = 0.1) -> Iterator[List[List[int]]]:
+        """
+        Gera várias leituras simuladas de sensores para o mesmo tabuleiro
+        
+        Os valores base e a amplitude do ruído de cada casa são calculados uma
+        única vez, e cada leitura só sorteia o ruído.
+        
+        Args:
+            matrix: Matriz real do tabuleiro
+            frames: Número de leituras a gerar
+            noise_level: Nível de ruído (0.0 a 1.0)
+            
+        Returns:
+            Iterador de matrizes com valores simulados de sensores
+        """
+        randint = _sensor_rng.randint
+        
+        # Simular valores de sensor (0-1023 para ADC de 10 bits)
+        piece = (800, int(noise_level * 200))  # Peça presente
+        empty = (200, int(noise_level * 100))  # Casa vazia
+        cells = [[piece if cell == 1 else empty for cell in row] for row in matrix]
+        
+        for _ in range(frames):
+            yield [
+                [max(0, min(1023, base + randint(-span, span))) for base, span in row]
+                for row in cells
+            ]
 
 # Exemplo de uso das utilitários
 if __name__ == "__main__":
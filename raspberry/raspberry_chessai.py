@@ -6,15 +6,72 @@ Autor: Sistema ChessAI
 Data: 2025
 """
 
+import asyncio
+import os
+import shutil
 import serial
 import json
 import time
-import threading
 import chess
 import chess.engine
+import chess.polyglot
 from typing import Dict, List, Tuple, Optional
 import logging
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
+from chessai_utils import occupancy_to_matrix, parse_square_name, parse_uci_move
+
+# orjson é opcional: quando instalado, (de)serializa as mensagens seriais mais rápido
+try:
+    import orjson
+    
+    json_loads = orjson.loads
+    
+    def encode_message(message: Dict) -> bytes:
+        """Serializa a mensagem como uma linha JSON pronta para a serial"""
+        return orjson.dumps(message) + b'\n'
+except ImportError:
+    json_loads = json.loads
+    
+    def encode_message(message: Dict) -> bytes:
+        """Serializa a mensagem como uma linha JSON pronta para a serial"""
+        return (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+
+# Número máximo de posições guardadas na tabela de transposição
+TT_MAX_ENTRIES = 200000
+
+# Tempo (s) da análise multipv que compara as opções de movimento do jogador
+MOVE_OPTIONS_TIME_LIMIT = 0.5
+
+# Intervalo (s) para reavaliar self.running sem dados na serial e espera após erro de leitura
+SERIAL_IDLE_TIMEOUT = 0.5
+SERIAL_ERROR_BACKOFF = 0.1
+
+# Bytes lidos por chamada quando a porta é observada pelo seletor do event loop
+SERIAL_READ_CHUNK = 4096
+
+# Rotação do arquivo de log (mesmos limites do config.json)
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Caminho do Stockfish encontrado na última execução (ao lado do config.json)
+STOCKFISH_CACHE_FILE = Path(__file__).with_name('stockfish_path.json')
+
+# Núcleos por processo Stockfish: acima disso as opções de movimento são divididas
+# entre vários processos (o SMP interno do Stockfish escala mal com muitas threads)
+ENGINE_CORES_PER_WORKER = 4
+
+# Hash do Stockfish: fração da RAM, limitada a um teto (MB); valor usado se a RAM for desconhecida
+ENGINE_HASH_RAM_FRACTION = 0.25
+ENGINE_HASH_MAX_MB = 1024
+ENGINE_HASH_DEFAULT_MB = 256
+
+# ioctl do Linux para ajustar a porta serial (struct serial_struct, campo flags no offset 16)
+TIOCGSERIAL = 0x541E
+TIOCSSERIAL = 0x541F
+ASYNC_LOW_LATENCY = 0x2000
+SERIAL_STRUCT_SIZE = 0x60
+SERIAL_FLAGS_OFFSET = 16
 
 class ConfigManager:
     """Gerenciador de configurações do ChessAI"""
@@ -46,7 +103,8 @@ class ConfigManager:
 
 class ChessAIServer:
     """Servidor principal do sistema ChessAI"""
-      def __init__(self, serial_port: str = '/dev/ttyUSB0', baudrate: int = 115200):
+    
+    def __init__(self, serial_port: str = '/dev/ttyUSB0', baudrate: int = 115200):
         """
         Inicializa o servidor ChessAI
         
@@ -61,31 +119,59 @@ class ChessAIServer:
         # Estado do jogo
         self.board = chess.Board()
         self.engine = None
+        self.engines = []  # Processos Stockfish que dividem a análise das opções
+        self._prev_occ = self.board.occupied  # Última ocupação enviada para a ESP32
         self.game_started = False
         self.waiting_for_move = False
         self.current_player_move = None
         
+        # Movimentos legais da posição atual agrupados por casa de origem
+        # (calculados sob demanda e descartados a cada movimento executado)
+        self.legal_moves_by_square = None
+        
+        # Tabela de transposição: hash Zobrist da posição -> avaliação do Stockfish
+        self.tt = {}
+        
+        # Análise especulativa da resposta da IA enquanto o jogador move a peça
+        self._speculative_key = None
+        self._speculative_task = None
+        
         # Logging (deve ser configurado primeiro)
         self.setup_logging()
         
         # Configurações do Stockfish (após logging)
         self.stockfish_path = self.find_stockfish_path()
         
-        # Threads
-        self.serial_thread = None
+        # Controle de execução do event loop
         self.running = False
+        self._rx_carry = b''
+        self._tx_buf = bytearray()  # Mensagens aguardando envio (um write por mensagem recebida)
+        self._tx_writer_fd = None  # Descritor com add_writer ativo enquanto o buffer do sistema está cheio
+        
+        # Tipo de mensagem da ESP32 -> manipulador (todos recebem os dados da mensagem)
+        self._dispatch = {
+            'game_start': lambda data: self.handle_game_start(),
+            'player_move': self.handle_player_move_origin,
+            'player_move_complete': self.handle_player_move_complete,
+            'ai_move_confirmed': lambda data: self.handle_ai_move_confirmed(),
+        }
         
         self.logger.info("ChessAI Server inicializado")
     
     def setup_logging(self) -> None:
         """Configura o sistema de logging"""
         logging.basicConfig(
-            level=logging.INFO,
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             handlers=[
-                logging.FileHandler('chessai.log'),
+                RotatingFileHandler('chessai.log', maxBytes=LOG_MAX_BYTES,
+                                    backupCount=LOG_BACKUP_COUNT, encoding='utf-8'),
                 logging.StreamHandler()
             ]        )
+        
+        # Nível padrão INFO, sem desfazer um DEBUG já pedido (--debug) antes do servidor
+        root = logging.getLogger()
+        if root.getEffectiveLevel() > logging.INFO:
+            root.setLevel(logging.INFO)
         self.logger = logging.getLogger('ChessAI')
     
     def find_stockfish_path(self) -> str:
@@ -95,6 +181,15 @@ class ChessAIServer:
         Returns:
             Caminho para o executável do Stockfish
         """
+        # Reaproveitar o caminho encontrado na última execução, se ainda for válido
+        try:
+            with open(STOCKFISH_CACHE_FILE, 'r', encoding='utf-8') as f:
+                cached_path = json.load(f).get('path')
+            if cached_path and (os.path.isfile(cached_path) or shutil.which(cached_path)):
+                return cached_path
+        except (OSError, ValueError, AttributeError):
+            pass
+        
         possible_paths = [
             '/usr/games/stockfish',
             '/usr/local/bin/stockfish',
@@ -108,11 +203,17 @@ class ChessAIServer:
         ]
         
         for path in possible_paths:
-            if Path(path).exists() or self.is_command_available(path):
+            # shutil.which procura no PATH sem executar o binário
+            if os.path.isfile(path) or shutil.which(path):
                 if hasattr(self, 'logger'):
                     self.logger.info(f"Stockfish encontrado em: {path}")
                 else:
                     print(f"Stockfish encontrado em: {path}")
+                try:
+                    with open(STOCKFISH_CACHE_FILE, 'w', encoding='utf-8') as f:
+                        json.dump({'path': path}, f)
+                except OSError:
+                    pass
                 return path
         
         if hasattr(self, 'logger'):
@@ -121,15 +222,6 @@ class ChessAIServer:
             print("ERRO: Stockfish não encontrado! Instale com: sudo apt-get install stockfish")
         return 'stockfish'  # Fallback
     
-    def is_command_available(self, command: str) -> bool:
-        """Verifica se um comando está disponível no sistema"""
-        import subprocess
-        try:
-            subprocess.run([command, '--version'], capture_output=True, timeout=5)
-            return True
-        except:
-            return False
-    
     def setup_serial_connection(self) -> bool:
         """
         Estabelece conexão serial com a ESP32
@@ -141,8 +233,10 @@ class ChessAIServer:
             self.serial_connection = serial.Serial(
                 port=self.serial_port,
                 baudrate=self.baudrate,
-                timeout=1
+                timeout=1,
+                write_timeout=0  # Escrita não bloqueante (no Linux o envio usa o descritor direto)
             )
+            self.enable_low_latency()
             time.sleep(2)  # Aguardar inicialização
             self.logger.info(f"Conexão serial estabelecida: {self.serial_port}")
             return True
@@ -150,7 +244,30 @@ class ChessAIServer:
             self.logger.error(f"Erro ao conectar na porta serial: {e}")
             return False
     
-    def setup_chess_engine(self) -> bool:
+    def enable_low_latency(self) -> bool:
+        """
+        Ativa o modo de baixa latência do adaptador USB-serial (FTDI) no Linux,
+        reduzindo o timer de leitura do driver de 16 ms para 1 ms
+        
+        Returns:
+            True se o modo foi ativado
+        """
+        try:
+            import fcntl
+            fd = self.serial_connection.fileno()
+            buf = bytearray(SERIAL_STRUCT_SIZE)
+            fcntl.ioctl(fd, TIOCGSERIAL, buf)
+            flags = int.from_bytes(buf[SERIAL_FLAGS_OFFSET:SERIAL_FLAGS_OFFSET + 4], 'little')
+            buf[SERIAL_FLAGS_OFFSET:SERIAL_FLAGS_OFFSET + 4] = (flags | ASYNC_LOW_LATENCY).to_bytes(4, 'little')
+            fcntl.ioctl(fd, TIOCSSERIAL, buf)
+            self.logger.info("Modo de baixa latência ativado na porta serial")
+            return True
+        except Exception as e:
+            # Fora do Linux ou com adaptadores sem suporte, segue com a latência padrão
+            self.logger.debug(f"Modo de baixa latência indisponível: {e}")
+            return False
+    
+    async def setup_chess_engine(self) -> bool:
         """
         Inicializa o engine de xadrez (Stockfish)
         
@@ -158,67 +275,158 @@ class ChessAIServer:
             True se o engine foi inicializado com sucesso
         """
         try:
-            self.engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
-            # Configurar parâmetros do engine
-            self.engine.configure({"Threads": 2, "Hash": 256})
-            self.logger.info("Engine Stockfish inicializado")
+            workers = max(1, (os.cpu_count() or 2) // ENGINE_CORES_PER_WORKER)
+            started = await asyncio.gather(
+                *(chess.engine.popen_uci(self.stockfish_path) for _ in range(workers)),
+                return_exceptions=True
+            )
+            errors = [result for result in started if isinstance(result, BaseException)]
+            if errors:
+                # Encerrar os processos que chegaram a iniciar antes de propagar a falha
+                await asyncio.gather(
+                    *(result[1].quit() for result in started if not isinstance(result, BaseException)),
+                    return_exceptions=True
+                )
+                raise errors[0]
+            self.engines = [engine for _, engine in started]
+            # O primeiro processo também joga pela IA; os demais só dividem a análise
+            self.engine = self.engines[0]
+            
+            # Configurar parâmetros do engine (o hash é mantido entre as jogadas da partida)
+            options = self.get_engine_options(workers)
+            await asyncio.gather(*(engine.configure(options) for engine in self.engines))
+            self.logger.info(f"Engine Stockfish inicializado: {workers} processo(s), {options}")
             return True
         except Exception as e:
             self.logger.error(f"Erro ao inicializar Stockfish: {e}")
             return False
     
+    def get_engine_options(self, workers: int = 1) -> Dict[str, int]:
+        """
+        Dimensiona threads e hash do Stockfish para a máquina atual
+        
+        Args:
+            workers: Número de processos Stockfish que dividem a máquina
+            
+        Returns:
+            Opções UCI para cada engine
+        """
+        # Deixar um núcleo livre para o event loop e a serial
+        threads = max(1, ((os.cpu_count() or 2) - 1) // workers)
+        
+        try:
+            ram_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+            hash_mb = max(16, min(ENGINE_HASH_MAX_MB, int(ram_mb * ENGINE_HASH_RAM_FRACTION)))
+        except (AttributeError, ValueError, OSError):
+            # os.sysconf não existe no Windows
+            hash_mb = ENGINE_HASH_DEFAULT_MB
+        
+        return {"Threads": threads, "Hash": max(16, hash_mb // workers)}
+    
     def start_server(self) -> None:
-        """Inicia o servidor ChessAI"""
+        """Inicia o servidor ChessAI (bloqueia até o servidor ser encerrado)"""
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            self.logger.info("Interrupção do usuário - encerrando servidor")
+            self.stop_server()
+    
+    async def run(self) -> None:
+        """Executa o servidor no event loop: leitura serial e engine no mesmo thread"""
         self.logger.info("Iniciando servidor ChessAI...")
         
         if not self.setup_serial_connection():
             self.logger.error("Falha ao estabelecer conexão serial")
             return
         
-        if not self.setup_chess_engine():
+        if not await self.setup_chess_engine():
             self.logger.error("Falha ao inicializar engine de xadrez")
             return
         
         self.running = True
-        self.serial_thread = threading.Thread(target=self.serial_listener)
-        self.serial_thread.daemon = True
-        self.serial_thread.start()
-        
         self.logger.info("Servidor ChessAI iniciado com sucesso!")
         self.logger.info("Aguardando sinal de início do jogo da ESP32...")
         
         try:
-            while self.running:
-                time.sleep(0.1)
-        except KeyboardInterrupt:
-            self.logger.info("Interrupção do usuário - encerrando servidor")
-            self.stop_server()
+            await self.serial_listener()
+        finally:
+            self.stop_tx_writer()
+            # Os engines assíncronos precisam ser encerrados dentro do event loop
+            await asyncio.gather(*(engine.quit() for engine in self.engines), return_exceptions=True)
+            self.engines = []
+            self.engine = None
     
     def stop_server(self) -> None:
         """Para o servidor ChessAI"""
         self.running = False
         
-        if self.engine:
-            self.engine.quit()
-        
         if self.serial_connection and self.serial_connection.is_open:
             self.serial_connection.close()
         
         self.logger.info("Servidor ChessAI encerrado")
     
-    def serial_listener(self) -> None:
-        """Thread para escutar mensagens da ESP32"""
-        while self.running:
-            try:
-                if self.serial_connection and self.serial_connection.in_waiting > 0:
-                    line = self.serial_connection.readline().decode('utf-8').strip()
-                    if line:
-                        self.process_received_message(line)
-            except Exception as e:
-                self.logger.error(f"Erro no listener serial: {e}")
-                time.sleep(1)
+    async def serial_listener(self) -> None:
+        """Escuta mensagens da ESP32 sem bloquear o event loop"""
+        loop = asyncio.get_running_loop()
+        
+        # O seletor do event loop (epoll no Linux) acorda quando a porta tem dados
+        data_ready = asyncio.Event()
+        try:
+            fd = self.serial_connection.fileno()
+            loop.add_reader(fd, data_ready.set)
+        except (AttributeError, NotImplementedError, ValueError, OSError):
+            # Windows ou portas sem descritor: leitura bloqueante fora do event loop
+            fd = None
+        
+        try:
+            while self.running:
+                try:
+                    if fd is None:
+                        data = await loop.run_in_executor(None, self.read_available)
+                    else:
+                        try:
+                            await asyncio.wait_for(data_ready.wait(), SERIAL_IDLE_TIMEOUT)
+                        except asyncio.TimeoutError:
+                            continue
+                        data_ready.clear()
+                        # Esvaziar de uma vez tudo que já chegou (descritor não bloqueante)
+                        try:
+                            data = os.read(fd, SERIAL_READ_CHUNK)
+                        except BlockingIOError:
+                            continue
+                        if not data:
+                            # Com VMIN=0 a leitura vazia indica despertar espúrio ou porta
+                            # desconectada: esperar um pouco para não girar em vazio
+                            await asyncio.sleep(SERIAL_ERROR_BACKOFF)
+                            continue
+                    if data:
+                        await self.dispatch_received_data(data)
+                except Exception as e:
+                    self.logger.error(f"Erro no listener serial: {e}")
+                    await asyncio.sleep(SERIAL_ERROR_BACKOFF)
+        finally:
+            if fd is not None:
+                loop.remove_reader(fd)
     
-    def process_received_message(self, message: str) -> None:
+    async def dispatch_received_data(self, data: bytes) -> None:
+        """
+        Separa os bytes recebidos em linhas e processa cada mensagem completa
+        
+        Args:
+            data: Bytes lidos da porta serial
+        """
+        # A última parte pode ser uma linha incompleta: guardar para a próxima leitura
+        *lines, self._rx_carry = (self._rx_carry + data).split(b'\n')
+        for raw in lines:
+            line = raw.decode('utf-8', 'replace').strip()
+            if line:
+                await self.process_received_message(line)
+    
+    def read_available(self) -> bytes:
+        """Lê todos os bytes disponíveis na porta serial (ao menos 1, respeitando o timeout)"""
+        return self.serial_connection.read(self.serial_connection.in_waiting or 1)
+    
+    async def process_received_message(self, message: str) -> None:
         """
         Processa mensagens recebidas da ESP32
         
@@ -226,49 +434,54 @@ class ChessAIServer:
             message: Mensagem JSON recebida
         """
         try:
-            data = json.loads(message)
+            data = json_loads(message)
             message_type = data.get('type', '')
             
             self.logger.info(f"Mensagem recebida: {message_type}")
             
-            if message_type == 'game_start':
-                self.handle_game_start()
-            elif message_type == 'player_move':
-                self.handle_player_move_origin(data)
-            elif message_type == 'player_move_complete':
-                self.handle_player_move_complete(data)
-            elif message_type == 'ai_move_confirmed':
-                self.handle_ai_move_confirmed()
-            else:
+            handler = self._dispatch.get(message_type)
+            if handler is None:
                 self.logger.warning(f"Tipo de mensagem desconhecido: {message_type}")
+                return
+            
+            # Manipuladores assíncronos devolvem uma corrotina
+            result = handler(data)
+            if asyncio.iscoroutine(result):
+                await result
                 
         except json.JSONDecodeError as e:
             self.logger.error(f"Erro ao decodificar JSON: {e}")
         except Exception as e:
             self.logger.error(f"Erro ao processar mensagem: {e}")
+        finally:
+            # Respostas geradas pela mensagem saem juntas em um único write
+            self.flush_tx()
+    
     def handle_game_start(self) -> None:
         """Manipula o início do jogo"""
         self.logger.info("=== INICIANDO NOVA PARTIDA DE XADREZ ===")
         
         # Reiniciar tabuleiro para posição inicial
+        self.cancel_speculation()
         self.board = chess.Board()
+        self.legal_moves_by_square = None
+        self._prev_occ = self.board.occupied
         self.game_started = True
         self.waiting_for_move = False
         
         self.logger.info("Tabuleiro reiniciado para posição inicial")
-        self.logger.info(f"FEN: {self.board.fen()}")
-        
-        # Enviar matriz inicial do tabuleiro (8x8 com 1s onde há peças, 0s onde está vazio)
-        board_matrix = self.get_initial_board_matrix()
         self.logger.info("Enviando matriz inicial do tabuleiro para ESP32...")
         
-        # Log da matriz para debug
-        self.logger.info("Matriz do tabuleiro:")
-        for i, row in enumerate(board_matrix):
-            self.logger.info(f"Linha {8-i}: {row}")
+        # Log da posição e da matriz só em modo debug (evita formatar as linhas em INFO)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"FEN: {self.board.fen()}")
+            self.logger.debug("Matriz do tabuleiro:")
+            for i, row in enumerate(self.get_initial_board_matrix()):
+                self.logger.debug(f"Linha {8-i}: {row}")
         
-        self.send_board_matrix(board_matrix)
-    def handle_player_move_origin(self, data: Dict) -> None:
+        # Enviar ocupação inicial do tabuleiro (bitboard com 1s onde há peças)        
+        self.send_board_matrix(self.board.occupied)
+    async def handle_player_move_origin(self, data: Dict) -> None:
         """
         Manipula quando o jogador remove uma peça (origem do movimento)
         
@@ -285,7 +498,7 @@ class ChessAIServer:
         
         try:
             # Converter notação para formato chess
-            square = chess.parse_square(from_square.lower())
+            square = parse_square_name(from_square)
             piece = self.board.piece_at(square)
             
             if not piece:
@@ -311,21 +524,26 @@ class ChessAIServer:
             self.logger.info(f"Encontrados {len(possible_moves)} movimentos possíveis")
             
             # Obter melhor movimento (usando IA para sugerir)
-            best_move = self.get_best_move_from_options(possible_moves)
+            self.cancel_speculation()
+            best_move = await self.get_best_move_from_options(possible_moves)
             alternatives = [move for move in possible_moves if move != best_move][:3]  # Máximo 3 alternativas
             
             self.logger.info(f"Melhor movimento sugerido: {best_move}")
-            self.logger.info(f"Alternativas: {[str(move) for move in alternatives]}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Alternativas: {[str(move) for move in alternatives]}")
             
             # Enviar opções para ESP32
             self.send_move_options(best_move, alternatives)
             
+            # Adiantar a resposta da IA para o movimento sugerido
+            await self.start_speculation(best_move)
+            
             self.current_player_move = from_square
             self.waiting_for_move = True
             
         except ValueError as e:
             self.logger.error(f"Erro ao processar posição {from_square}: {e}")
-    def handle_player_move_complete(self, data: Dict) -> None:
+    async def handle_player_move_complete(self, data: Dict) -> None:
         """
         Manipula quando o jogador completa um movimento
         
@@ -344,28 +562,32 @@ class ChessAIServer:
         try:
             # Validar e executar movimento
             move_uci = from_square.lower() + to_square.lower()
-            move = chess.Move.from_uci(move_uci)
+            move = parse_uci_move(move_uci)
             
-            if move in self.board.legal_moves:
+            if move in self.get_legal_moves_by_square().get(move.from_square, ()):
                 self.board.push(move)
+                self.legal_moves_by_square = None
+                self.send_board_delta()
                 self.logger.info(f"Movimento executado com sucesso: {move}")
-                self.logger.info(f"Nova posição FEN: {self.board.fen()}")
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(f"Nova posição FEN: {self.board.fen()}")
                 
-                # Verificar fim de jogo
+                # Verificar fim de jogo (a análise especulativa não servirá mais)
                 if self.board.is_game_over():
+                    self.cancel_speculation()
                     self.handle_game_over()
                     return
                 
                 # Calcular e enviar movimento da IA imediatamente
                 self.logger.info("Calculando movimento da IA...")
-                self.calculate_and_send_ai_move()
+                await self.calculate_and_send_ai_move()
                 
             else:
                 self.logger.error(f"Movimento ilegal: {move_uci}")
-                self.logger.error("Movimentos legais disponíveis:")
-                for legal_move in self.board.legal_moves:
-                    if legal_move.from_square == chess.parse_square(from_square.lower()):
-                        self.logger.error(f"  {legal_move}")
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("Movimentos legais disponíveis:")
+                    for legal_move in self.get_legal_moves_by_square().get(move.from_square, ()):
+                        self.logger.debug(f"  {legal_move}")
                 
         except ValueError as e:
             self.logger.error(f"Erro ao processar movimento: {e}")
@@ -429,17 +651,7 @@ class ChessAIServer:
         Returns:
             Matriz 8x8 representando o estado inicial do tabuleiro
         """
-        matrix = []
-        
-        for rank in range(8, 0, -1):  # 8 a 1 (de cima para baixo)
-            row = []
-            for file in range(8):  # a-h
-                square = chess.square(file, rank - 1)
-                piece = self.board.piece_at(square)
-                row.append(1 if piece else 0)
-            matrix.append(row)
-        
-        return matrix
+        return occupancy_to_matrix(self.board.occupied)
     
     def get_possible_moves_from_square(self, square: int) -> List[chess.Move]:
         """
@@ -451,15 +663,23 @@ class ChessAIServer:
         Returns:
             Lista de movimentos possíveis
         """
-        possible_moves = []
-        
-        for move in self.board.legal_moves:
-            if move.from_square == square:
-                possible_moves.append(move)
+        return list(self.get_legal_moves_by_square().get(square, ()))
+    
+    def get_legal_moves_by_square(self) -> Dict[int, List[chess.Move]]:
+        """
+        Obtém os movimentos legais da posição atual agrupados por casa de origem
         
-        return possible_moves
+        Returns:
+            Dicionário casa de origem -> lista de movimentos legais
+        """
+        if self.legal_moves_by_square is None:
+            grouped = {}
+            for move in self.board.legal_moves:
+                grouped.setdefault(move.from_square, []).append(move)
+            self.legal_moves_by_square = grouped
+        return self.legal_moves_by_square
     
-    def get_best_move_from_options(self, moves: List[chess.Move]) -> chess.Move:
+    async def get_best_move_from_options(self, moves: List[chess.Move]) -> chess.Move:
         """
         Escolhe o melhor movimento dentre as opções usando a IA
         
@@ -473,45 +693,137 @@ class ChessAIServer:
             return None
         
         try:
-            # Avaliar cada movimento
-            best_move = moves[0]
-            best_score = float('-inf')
+            scores = await self.evaluate_moves(moves)
             
-            for move in moves:
-                # Fazer movimento temporário
-                self.board.push(move)
-                
-                # Avaliar posição
-                info = self.engine.analyse(self.board, chess.engine.Limit(time=0.1))
-                score = info['score'].relative.score(mate_score=10000)
-                
-                # Desfazer movimento
-                self.board.pop()
-                
-                # Atualizar melhor movimento
-                if score > best_score:
-                    best_score = score
-                    best_move = move
-            
-            return best_move
+            # Em caso de empate, prevalece o primeiro movimento da lista
+            return max(moves, key=lambda move: scores[move])
             
         except Exception as e:
             self.logger.error(f"Erro ao avaliar movimentos: {e}")
-            return moves[0]  # Retornar primeiro movimento como fallback    def calculate_and_send_ai_move(self) -> None:
+            return moves[0]  # Retornar primeiro movimento como fallback
+    
+    async def evaluate_moves(self, moves: List[chess.Move]) -> Dict[chess.Move, int]:
+        """
+        Avalia movimentos candidatos da posição atual
+        
+        Movimentos cujas posições resultantes já estão na tabela de transposição
+        não voltam ao Stockfish; os demais são divididos entre os processos do
+        Stockfish, cada um com uma análise multipv restrita à sua parte.
+        
+        Args:
+            moves: Movimentos legais da posição atual
+            
+        Returns:
+            Dicionário movimento -> avaliação em centipawns do ponto de vista de quem joga
+        """
+        scores = {}
+        pending = {}
+        
+        for move in moves:
+            self.board.push(move)
+            key = chess.polyglot.zobrist_hash(self.board)
+            self.board.pop()
+            
+            # A tabela guarda a avaliação do ponto de vista de quem joga na posição resultante
+            cached = self.tt.get(key)
+            if cached is None:
+                pending[move] = key
+            else:
+                scores[move] = -cached
+        
+        if pending:
+            # Dividir os movimentos na raiz entre os engines e analisar em paralelo
+            candidates = list(pending)
+            workers = len(self.engines)
+            chunks = [candidates[i::workers] for i in range(workers)]
+            results = await asyncio.gather(*(
+                engine.analyse(
+                    self.board,
+                    chess.engine.Limit(time=MOVE_OPTIONS_TIME_LIMIT),
+                    multipv=len(chunk),
+                    root_moves=chunk
+                )
+                for engine, chunk in zip(self.engines, chunks) if chunk
+            ))
+            
+            for info in (info for infos in results for info in infos):
+                if 'pv' not in info or 'score' not in info:
+                    continue
+                move = info['pv'][0]
+                if move not in pending:
+                    continue
+                score = info['score'].pov(self.board.turn).score(mate_score=10000)
+                scores[move] = score
+                self.store_evaluation(pending[move], -score)
+        
+        # Movimentos sem resultado da análise ficam com a pior avaliação
+        worst = min(scores.values(), default=0)
+        for move in pending:
+            scores.setdefault(move, worst)
+        
+        return scores
+    
+    def store_evaluation(self, key: int, score: int) -> None:
+        """Guarda a avaliação de uma posição na tabela de transposição"""
+        self.tt[key] = score
+        if len(self.tt) > TT_MAX_ENTRIES:
+            # dict mantém a ordem de inserção: descartar a posição mais antiga
+            del self.tt[next(iter(self.tt))]
+    
+    async def start_speculation(self, move: chess.Move) -> None:
+        """
+        Inicia a análise da posição após o movimento sugerido, enquanto o
+        jogador ainda está movendo a peça
+        
+        Args:
+            move: Movimento mais provável do jogador
+        """
+        self.cancel_speculation()
+        try:
+            self.board.push(move)
+            self._speculative_key = chess.polyglot.zobrist_hash(self.board)
+            self._speculative_task = await self.engine.analysis(self.board, chess.engine.Limit(time=2.0))
+        except Exception as e:
+            self.logger.error(f"Erro ao iniciar análise especulativa: {e}")
+            self._speculative_key = None
+        finally:
+            self.board.pop()
+    
+    def cancel_speculation(self) -> None:
+        """Interrompe a análise especulativa em andamento, se houver"""
+        if self._speculative_task is not None:
+            self._speculative_task.stop()
+        self._speculative_task = None
+        self._speculative_key = None
+    
+    async def calculate_and_send_ai_move(self) -> None:
         """Calcula e envia movimento da IA"""
         try:
             self.logger.info("=== CALCULANDO MOVIMENTO DA IA ===")
             
-            # Obter melhor movimento da IA (pretas)
-            result = self.engine.play(self.board, chess.engine.Limit(time=2.0))
-            ai_move = result.move
+            # Obter melhor movimento da IA (pretas), reaproveitando a análise
+            # especulativa se o jogador fez o movimento sugerido
+            ai_move = None
+            task = self._speculative_task
+            if task is not None and self._speculative_key == chess.polyglot.zobrist_hash(self.board):
+                self._speculative_task = self._speculative_key = None
+                ai_move = (await task.wait()).move
+            else:
+                self.cancel_speculation()
+            
+            if ai_move is None:
+                # ponder: o engine continua pensando na resposta esperada do jogador
+                result = await self.engine.play(self.board, chess.engine.Limit(time=2.0), ponder=True)
+                ai_move = result.move
             
             self.logger.info(f"IA escolheu movimento: {ai_move}")
             
             # Executar movimento no tabuleiro
             self.board.push(ai_move)
+            self.legal_moves_by_square = None
             self.logger.info(f"Movimento da IA executado: {ai_move}")
-            self.logger.info(f"Nova posição FEN: {self.board.fen()}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Nova posição FEN: {self.board.fen()}")
             
             # Converter para notação
             from_square = chess.square_name(ai_move.from_square).upper()
@@ -519,7 +831,8 @@ class ChessAIServer:
             
             self.logger.info(f"=== IA MOVE: {from_square} → {to_square} ===")
             
-            # Enviar movimento para ESP32
+            # Enviar casas alteradas e movimento para ESP32
+            self.send_board_delta()
             self.send_ai_move(from_square, to_square)
             
         except Exception as e:
@@ -527,19 +840,36 @@ class ChessAIServer:
             import traceback
             self.logger.error(traceback.format_exc())
     
-    def send_board_matrix(self, matrix: List[List[int]]) -> None:
+    def send_board_matrix(self, occupied: int) -> None:
         """
-        Envia matriz do tabuleiro para ESP32
+        Envia a ocupação do tabuleiro para ESP32
         
         Args:
-            matrix: Matriz 8x8 do tabuleiro
+            occupied: Bitboard de ocupação (bit 0 = A1, bit 63 = H8)
         """
-        # Converter matriz 2D para array 1D
-        flat_matrix = [cell for row in matrix for cell in row]
-        
+        # 16 dígitos hexadecimais em vez de um array JSON com 64 inteiros
         message = {
             "type": "board_matrix",
-            "matrix": flat_matrix
+            "occ": f"{occupied:016x}"
+        }
+        
+        self.send_json_message(message)
+    
+    def send_board_delta(self) -> None:
+        """
+        Envia para ESP32 apenas as casas cuja ocupação mudou desde o último envio
+        (capturas, roque e en passant incluídos)
+        """
+        occupied = self.board.occupied
+        delta = self._prev_occ ^ occupied
+        self._prev_occ = occupied
+        if not delta:
+            return
+        
+        message = {
+            "type": "board_delta",
+            "delta": f"{delta:016x}",
+            "occ": f"{occupied:016x}"
         }
         
         self.send_json_message(message)
@@ -586,13 +916,74 @@ class ChessAIServer:
         Args:
             message: Dicionário com dados da mensagem
         """
+        # A mensagem é acumulada e sai no próximo flush_tx
+        self._tx_buf += encode_message(message)
+        self.logger.debug(f"Mensagem enfileirada: {message['type']}")
+    
+    def flush_tx(self) -> None:
+        """Envia as mensagens acumuladas para ESP32 em uma única escrita"""
+        # Com um writer registrado, o restante (e o que chegou depois) sai por ele
+        if not self._tx_buf or self._tx_writer_fd is not None:
+            return
+        
+        if not (self.serial_connection and self.serial_connection.is_open):
+            self._tx_buf.clear()
+            return
+        
         try:
-            if self.serial_connection and self.serial_connection.is_open:
-                json_str = json.dumps(message) + '\n'
-                self.serial_connection.write(json_str.encode('utf-8'))
-                self.logger.debug(f"Mensagem enviada: {message['type']}")
-        except Exception as e:
+            fd = self.serial_connection.fileno()
+        except (AttributeError, ValueError, OSError):
+            fd = None
+        
+        if fd is None:
+            # Windows ou portas sem descritor: escrita do próprio pyserial
+            try:
+                self.serial_connection.write(self._tx_buf)
+            except Exception as e:
+                self.logger.error(f"Erro ao enviar mensagem: {e}")
+            self._tx_buf.clear()
+            return
+        
+        self.write_tx(fd)
+    
+    def write_tx(self, fd: int) -> None:
+        """
+        Escreve o buffer de envio no descritor não bloqueante da porta; se o
+        buffer do sistema encher, o event loop chama de novo quando houver espaço
+        
+        Args:
+            fd: Descritor da porta serial
+        """
+        # O pyserial repete o write internamente até enviar tudo (mesmo com
+        # write_timeout=0), o que travaria o event loop: usar os.write direto
+        try:
+            while self._tx_buf:
+                written = os.write(fd, self._tx_buf)
+                del self._tx_buf[:written]
+        except BlockingIOError:
+            pass
+        except OSError as e:
             self.logger.error(f"Erro ao enviar mensagem: {e}")
+            self._tx_buf.clear()
+        
+        if not self._tx_buf:
+            self.stop_tx_writer()
+        elif self._tx_writer_fd is None:
+            try:
+                asyncio.get_running_loop().add_writer(fd, self.write_tx, fd)
+                self._tx_writer_fd = fd
+            except RuntimeError:
+                pass  # Fora do event loop: o restante sai no próximo flush
+    
+    def stop_tx_writer(self) -> None:
+        """Remove o writer do event loop, se houver um registrado"""
+        if self._tx_writer_fd is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_writer(self._tx_writer_fd)
+        except RuntimeError:
+            pass
+        self._tx_writer_fd = None
     
     def get_board_status(self) -> Dict:
         """
@@ -4,15 +4,21 @@ import time
 # Chave usada para criptografar (deve ser igual à da ESP32)
 CHAVE = ord('K')
 
+# Tabela com o XOR de cada valor de byte: bytes.translate aplica a chave em C
+TABELA_XOR = bytes(b ^ CHAVE for b in range(256))
+
 # Função para codificar/decodificar usando XOR
 def codificar(msg):
-    return bytes([c ^ CHAVE for c in msg.encode('utf-8')])
+    return msg.encode('utf-8').translate(TABELA_XOR)
 
 def decodificar(data):
-    return ''.join([chr(b ^ CHAVE) for b in data])
+    return data.translate(TABELA_XOR).decode('utf-8', 'replace')
+
+# Fim de linha como chega da ESP32 (o '\n' também passa pelo XOR)
+FIM_CODIFICADO = codificar('\n')
 
 # Abre a comunicação serial com a ESP32
-ser = serial.Serial("/dev/serial0", 115200, timeout=1)
+ser = serial.Serial("/dev/serial0", 115200, timeout=0.2)
 time.sleep(2)  # Tempo para a ESP32 resetar
 
 # Envia mensagem codificada
@@ -20,9 +26,8 @@ mensagem = "start"
 ser.write(codificar(mensagem + '\n'))
 print(f"Enviado (codificado): {mensagem}")
 
-# Aguarda resposta da ESP32
-time.sleep(1)
-resposta = ser.read_all()
+# Aguarda a resposta da ESP32 até o fim de linha (ou o timeout de 200 ms)
+resposta = ser.read_until(FIM_CODIFICADO)
 
 if resposta:
     decodificada = decodificar(resposta)
@@ -8,11 +8,27 @@ import sys
 import os
 import time
 import subprocess
+import runpy
+import importlib.util
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+# Limite de tempo de cada teste em subprocesso (segundos)
+TEST_TIMEOUT = 120
+
+# orjson é opcional: grava o relatório direto em bytes, sem passar pelo json padrão
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 class TestRunner:
+    # Interpretador atual, já resolvido: vale para todos os subprocessos
+    PYTHON_CMD = sys.executable or 'python'
+    
     def __init__(self):
         self.test_dir = Path(__file__).parent
         self.results = {
@@ -23,80 +39,149 @@ class TestRunner:
             'duration': 0,
             'details': {}
         }
+        # Os testes rodam em paralelo: cada bloco de saída é impresso inteiro
+        self.print_lock = threading.Lock()
         
-    def run_test(self, test_file: str, description: str) -> bool:
+    def run_test(self, test_file: str, description: str, in_process: bool = False) -> bool:
         """Executa um teste individual"""
-        print(f"\n{'='*60}")
-        print(f"🧪 {description}")
-        print(f"📄 Arquivo: {test_file}")
-        print(f"{'='*60}")
+        header = f"\n{'='*60}\n🧪 {description}\n📄 Arquivo: {test_file}\n{'='*60}"
+        
+        if in_process:
+            # A saída do teste vai direto para o terminal; só roda depois que os
+            # testes em subprocesso terminaram, então o lock não atrasa ninguém
+            with self.print_lock:
+                print(header)
+                return self._run_test(test_file, print, in_process=True)
         
+        # Cabeçalho antes das linhas transmitidas ao vivo; o resultado sai em bloco no final
+        with self.print_lock:
+            print(header)
+        
+        # Com os testes em paralelo, o bloco final precisa dizer de qual teste é
+        output = [f"\n🏁 Fim de {test_file}"]
+        try:
+            return self._run_test(test_file, output.append)
+        finally:
+            with self.print_lock:
+                print('\n'.join(output))
+    
+    def _run_test(self, test_file: str, log, in_process: bool = False) -> bool:
+        """Executa o teste, enviando as linhas de saída para log"""
         test_path = self.test_dir / test_file
         
         if not test_path.exists():
-            print(f"❌ Arquivo de teste não encontrado: {test_file}")
+            log(f"❌ Arquivo de teste não encontrado: {test_file}")
             return False
         
+        if in_process:
+            return self._run_in_process(test_path, log)
+        
         try:
-            # Determinar comando Python
-            python_cmd = 'py' 
-            
-            start_time = time.time()
+            start_time = time.perf_counter()
             
-            # Executar teste
-            result = subprocess.run(
-                [python_cmd, str(test_path)],
-                capture_output=True,
+            # Executar teste, com stderr junto no mesmo fluxo; -u desliga o buffer
+            # do processo filho, senão a saída só chegaria ao encher o pipe
+            proc = subprocess.Popen(
+                [self.PYTHON_CMD, '-u', str(test_path)],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
                 text=True,
-                timeout=120  # 2 minutos de timeout
+                bufsize=1
             )
             
-            duration = time.time() - start_time
+            # O timer mata o processo travado mesmo com a leitura bloqueada
+            timed_out = threading.Event()
+            def kill():
+                timed_out.set()
+                proc.kill()
+            timer = threading.Timer(TEST_TIMEOUT, kill)
+            timer.start()
+            
+            # Mostrar saída ao vivo, linha a linha, identificada pelo arquivo
+            try:
+                with proc.stdout:
+                    for line in proc.stdout:
+                        with self.print_lock:
+                            print(f"[{test_path.stem}] {line}", end='')
+                proc.wait()
+            finally:
+                timer.cancel()
             
-            # Mostrar saída
-            if result.stdout:
-                print("📤 Saída:")
-                print(result.stdout)
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(proc.args, TEST_TIMEOUT)
             
-            if result.stderr:
-                print("⚠️ Erros/Avisos:")
-                print(result.stderr)
+            duration = time.perf_counter() - start_time
             
             # Verificar resultado
-            success = result.returncode == 0
+            success = proc.returncode == 0
             
-            print(f"\n⏱️ Tempo: {duration:.2f}s")
-            print(f"🎯 Resultado: {'✅ PASSOU' if success else '❌ FALHOU'}")
+            log(f"\n⏱️ Tempo: {duration:.2f}s")
+            log(f"🎯 Resultado: {'✅ PASSOU' if success else '❌ FALHOU'}")
             
             return success
             
         except subprocess.TimeoutExpired:
-            print(f"⏰ Timeout! Teste demorou mais que 2 minutos")
+            log(f"⏰ Timeout! Teste demorou mais que {TEST_TIMEOUT}s")
             return False
         except Exception as e:
-            print(f"❌ Erro ao executar teste: {e}")
+            log(f"❌ Erro ao executar teste: {e}")
             return False
     
-    def run_all_tests(self):
+    def _run_in_process(self, test_path: Path, log) -> bool:
+        """Executa o teste no próprio interpretador, sem custo de subprocesso"""
+        start_time = time.perf_counter()
+        
+        try:
+            runpy.run_path(str(test_path), run_name="__main__")
+            success = True
+        except SystemExit as e:
+            success = e.code in (0, None)
+        except Exception as e:
+            log(f"❌ Erro ao executar teste: {e}")
+            success = False
+        
+        duration = time.perf_counter() - start_time
+        
+        log(f"\n⏱️ Tempo: {duration:.2f}s")
+        log(f"🎯 Resultado: {'✅ PASSOU' if success else '❌ FALHOU'}")
+        
+        return success
+    
+    def run_all_tests(self, in_process: bool = False):
         """Executa todos os testes disponíveis"""
         print("🚀 ChessAI - Executor de Testes")
         print(f"📍 Diretório: {self.test_dir}")
         print(f"🕒 Iniciado em: {datetime.now().strftime('%H:%M:%S')}")
         
-        start_time = time.time()
+        start_time = time.monotonic()
         
-        # Lista de testes para executar
+        # Lista de testes para executar (isolado = sempre em subprocesso,
+        # pois mexe em logging/serial ou espera entrada do usuário)
         tests = [
-            ('test_basic.py', 'Teste Básico - Inicialização'),
-            ('test_communication.py', 'Teste de Comunicação - Simulação'),
-            ('test_final_integration.py', 'Teste de Integração Completa')
+            ('test_basic.py', 'Teste Básico - Inicialização', True),
+            ('test_communication.py', 'Teste de Comunicação - Simulação', True),
+            ('test_final_integration.py', 'Teste de Integração Completa', False)
         ]
         
-        # Executar cada teste
-        for test_file, description in tests:
+        # Executar os testes em paralelo (processos independentes); com
+        # in_process os testes leves rodam aqui mesmo, depois dos outros, para
+        # não prender o terminal enquanto o timeout deles está correndo
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            futures = {test_file: executor.submit(self.run_test, test_file, description)
+                       for test_file, description, isolated in tests
+                       if isolated or not in_process}
+        local_results = {test_file: self.run_test(test_file, description, in_process=True)
+                         for test_file, description, _ in tests
+                         if test_file not in futures}
+        
+        # Consolidar na ordem da lista de testes
+        for test_file, _, _ in tests:
             self.results['tests_run'] += 1
             
-            success = self.run_test(test_file, description)
+            if test_file in futures:
+                success = futures[test_file].result()
+            else:
+                success = local_results[test_file]
             
             if success:
                 self.results['tests_passed'] += 1
@@ -106,7 +191,7 @@ class TestRunner:
                 self.results['details'][test_file.replace('.py', '')] = 'FAIL'
         
         # Calcular tempo total
-        total_time = time.time() - start_time
+        total_time = time.monotonic() - start_time
         self.results['duration'] = f"{total_time:.2f}s"
         
         # Mostrar resumo
@@ -144,8 +229,13 @@ class TestRunner:
         try:
             report_file = self.test_dir / 'test_report.json'
             
-            with open(report_file, 'w', encoding='utf-8') as f:
-                json.dump(self.results, f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                with open(report_file, 'wb') as f:
+                    f.write(orjson.dumps(self.results, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+            else:
+                with open(report_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.results, f, indent=2, ensure_ascii=False)
+                    f.write('\n')
             
             print(f"\n💾 Relatório salvo: {report_file}")
             
@@ -163,11 +253,11 @@ def check_dependencies():
     dependencies = ['chess', 'serial', 'json', 'threading']
     missing = []
     
+    # find_spec só localiza o módulo, sem executar sua inicialização
     for dep in dependencies:
-        try:
-            __import__(dep)
+        if importlib.util.find_spec(dep) is not None:
             print(f"✅ {dep}: OK")
-        except ImportError:
+        else:
             print(f"❌ {dep}: NÃO ENCONTRADO")
             missing.append(dep)
     
@@ -193,7 +283,7 @@ def main():
     runner = TestRunner()
     
     try:
-        return runner.run_all_tests()
+        return runner.run_all_tests(in_process='--in-process' in sys.argv)
     except KeyboardInterrupt:
         print("\n\n⏹️ Testes interrompidos pelo usuário")
         return 1
@@ -5,27 +5,84 @@ Simulador de comunicação entre ESP32 e Raspberry Pi
 Para testes sem hardware físico
 """
 
+import os
+import sys
 import json
-import time
-import threading
-import queue
+import asyncio
+from itertools import chain
 from typing import Dict, Any
+
+# readline (POSIX) dá edição de linha e histórico ao input() do menu
+try:
+    import readline
+except ImportError:
+    pass
+
 from chessai_utils import (
     CommunicationProtocol, 
     BoardStateManager, 
     LEDController, 
     TestUtilities,
-    ChessNotationConverter
+    RC_TO_SQUARE,
+    MSG_GAME_START,
+    MSG_BOARD_MATRIX,
+    MSG_BOARD_DELTA,
+    MSG_PLAYER_MOVE,
+    MSG_PLAYER_MOVE_COMPLETE,
+    MSG_MOVE_OPTIONS,
+    MSG_AI_MOVE,
+    MSG_AI_MOVE_CONFIRMED
+)
+
+# FAST_TEST=1 no ambiente elimina as pausas que imitam o tempo humano/físico
+FAST_TEST = os.environ.get('FAST_TEST', '') not in ('', '0')
+
+# Espera máxima (s) por uma resposta ainda em preparo no ciclo de comunicação
+RESPONSE_TIMEOUT = 0.05
+
+async def simulate_delay(seconds: float):
+    """Pausa que imita o tempo real (ignorada com FAST_TEST)"""
+    if not FAST_TEST:
+        await asyncio.sleep(seconds)
+
+# Nome das 64 casas indexado por linha * 8 + coluna (linha 0 = fileira 8)
+SQUARES = tuple(chain.from_iterable(RC_TO_SQUARE))
+
+# Ocupação da posição inicial: fileiras 1, 2, 7 e 8
+INITIAL_OCCUPANCY = 0xFFFF00000000FFFF
+
+# Opções de movimento simuladas, já no formato do protocolo (maiúsculas)
+EXAMPLE_BEST_MOVE = 'E2E4'
+EXAMPLE_ALTERNATIVES = ('E2E3', 'D2D4')
+
+# Linhas da animação de confirmação, já formatadas por fileira
+ANIMATION_ROWS = tuple(
+    ''.join(f"LED {square} -> VERDE (animação)\n" for square in SQUARES[i:i + 8])
+    for i in range(0, 64, 8)
 )
 
 class ESP32Simulator:
     """Simulador da ESP32 para testes"""
     
+    # Conjunto fixo de atributos: sem __dict__ por instância
+    __slots__ = ('message_queue', 'response_queue', '_dispatch', 'led_controller',
+                 'board_occupied', 'current_state', 'running')
+    
     def __init__(self):
-        self.message_queue = queue.Queue()
-        self.response_queue = queue.Queue()
+        # Filas do loop asyncio do testador: um put acorda quem aguarda no get
+        self.message_queue = asyncio.Queue()
+        self.response_queue = asyncio.Queue()
+        
+        # Manipuladores indexados pelo tipo da mensagem recebida
+        self._dispatch = {
+            MSG_BOARD_MATRIX: self.handle_board_matrix,
+            MSG_BOARD_DELTA: self.handle_board_delta,
+            MSG_MOVE_OPTIONS: self.handle_move_options,
+            MSG_AI_MOVE: self.handle_ai_move,
+        }
         self.led_controller = LEDController()
-        self.board_matrix = None
+        # Ocupação do tabuleiro como bitboard (bit 0 = A1, bit 63 = H8)
+        self.board_occupied = None
         self.current_state = "WAITING_START"
         self.running = False
         
@@ -43,61 +100,88 @@ class ESP32Simulator:
     
     def send_game_start(self):
         """Simula pressionar botão de início"""
-        message = CommunicationProtocol.create_message(
-            CommunicationProtocol.MESSAGE_TYPES['GAME_START'],
-            {}
-        )
-        self.response_queue.put(message)
+        message = CommunicationProtocol.create_static_message(MSG_GAME_START)
+        self.send_response(message)
         print("ESP32: Sinal de início enviado")
         self.current_state = "INITIALIZING_BOARD"
     
-    def receive_message(self, message: str):
-        """Recebe mensagem da Raspberry Pi"""
-        data = CommunicationProtocol.parse_message(message)
-        if not data:
+    async def receive_message(self, message: str):
+        """Recebe mensagem (ou lote de mensagens) da Raspberry Pi"""
+        messages = CommunicationProtocol.parse_messages(message)
+        if not messages:
             print("ESP32: Erro ao processar mensagem")
             return
         
-        msg_type = data.get('type', '')
-        print(f"ESP32: Recebida mensagem tipo '{msg_type}'")
-        
-        if msg_type == 'board_matrix':
-            self.handle_board_matrix(data)
-        elif msg_type == 'move_options':
-            self.handle_move_options(data)
-        elif msg_type == 'ai_move':
-            self.handle_ai_move(data)
+        for data in messages:
+            # Tipo ausente (None) ou desconhecido cai direto no descarte
+            msg_type = data.get('type')
+            handler = self._dispatch.get(msg_type)
+            if handler is None:
+                print(f"ESP32: Mensagem ignorada (tipo {msg_type!r})")
+                continue
+            
+            print(f"ESP32: Recebida mensagem tipo '{msg_type}'")
+            await handler(data)
     
-    def handle_board_matrix(self, data: Dict):
+    async def handle_board_matrix(self, data: Dict):
         """Processa matriz do tabuleiro"""
-        matrix_flat = data.get('matrix', [])
-        if len(matrix_flat) != 64:
+        occ = data.get('occ', '')
+        try:
+            occupied = int(occ, 16)
+        except (TypeError, ValueError):
             print("ESP32: Erro - matriz inválida")
             return
         
-        # Converter para matriz 8x8
-        self.board_matrix = []
-        for i in range(8):
-            row = matrix_flat[i*8:(i+1)*8]
-            self.board_matrix.append(row)
+        self.board_occupied = occupied
         
-        print("ESP32: Matriz do tabuleiro recebida")
-        self.validate_board_setup()
+        print(f"ESP32: Matriz do tabuleiro recebida ({bin(occupied).count('1')} peças)")
+        await self.validate_board_setup()
     
-    def validate_board_setup(self):
+    async def handle_board_delta(self, data: Dict):
+        """Atualiza apenas as casas que mudaram de ocupação"""
+        try:
+            delta = int(data.get('delta', ''), 16)
+            occupied = int(data.get('occ', ''), 16)
+        except (TypeError, ValueError):
+            print("ESP32: Erro - delta inválido")
+            return
+        
+        if self.board_occupied is None:
+            return
+        
+        # Aplicar o delta com um XOR; divergência indica mensagem perdida
+        self.board_occupied ^= delta
+        if self.board_occupied != occupied:
+            print("ESP32: Aviso - ocupação divergente, ressincronizando")
+            self.board_occupied = occupied
+        
+        print("ESP32: Ocupação do tabuleiro atualizada")
+    
+    async def validate_board_setup(self):
         """Simula validação física do tabuleiro"""
         print("ESP32: Validando configuração física do tabuleiro...")
         
-        # Simular validação bem-sucedida
-        time.sleep(1)
+        await simulate_delay(1)
+        
+        # Comparar com a posição inicial: um único XOR aponta as casas erradas
+        wrong = self.board_occupied ^ INITIAL_OCCUPANCY
+        if wrong:
+            # Percorrer só os bits ligados (LS1B); bit ^ 56 inverte a fileira
+            # para o índice de SQUARES (linha 0 = fileira 8)
+            squares = []
+            while wrong:
+                lsb = wrong & -wrong
+                squares.append(SQUARES[(lsb.bit_length() - 1) ^ 56])
+                wrong ^= lsb
+            print(f"ESP32: Erro - casas fora da posição inicial: {squares}")
+            return
+        
         print("ESP32: Tabuleiro validado! Animação de confirmação...")
         
-        # Simular animação
-        for i in range(8):
-            for j in range(8):
-                square = ChessNotationConverter.coordinates_to_square(i, j)
-                print(f"LED {square} -> VERDE (animação)")
-                time.sleep(0.05)
+        # Simular animação, uma fileira (8 LEDs) por escrita
+        for row in ANIMATION_ROWS:
+            sys.stdout.write(row)
+            await simulate_delay(0.4)
         
         print("ESP32: Pronto para receber jogadas!")
         self.current_state = "WAITING_PLAYER_MOVE"
@@ -111,13 +195,13 @@ class ESP32Simulator:
         print(f"ESP32: Peça removida de {from_square}")
         
         message = CommunicationProtocol.create_message(
-            CommunicationProtocol.MESSAGE_TYPES['PLAYER_MOVE'],
+            MSG_PLAYER_MOVE,
             {'from': from_square}
         )
-        self.response_queue.put(message)
+        self.send_response(message)
         self.current_state = "PROCESSING_MOVE"
     
-    def handle_move_options(self, data: Dict):
+    async def handle_move_options(self, data: Dict):
         """Processa opções de movimento"""
         best_move = data.get('best_move', '')
         alternatives = data.get('alternatives', [])
@@ -133,16 +217,16 @@ class ESP32Simulator:
             from_square = best_move[:2].upper()
             
             print(f"ESP32: Simulando jogador movendo para {to_square}")
-            time.sleep(2)
+            await simulate_delay(2)
             
             message = CommunicationProtocol.create_message(
-                CommunicationProtocol.MESSAGE_TYPES['PLAYER_MOVE_COMPLETE'],
+                MSG_PLAYER_MOVE_COMPLETE,
                 {'from': from_square, 'to': to_square}
             )
-            self.response_queue.put(message)
+            self.send_response(message)
             self.current_state = "WAITING_AI_MOVE"
     
-    def handle_ai_move(self, data: Dict):
+    async def handle_ai_move(self, data: Dict):
         """Processa movimento da IA"""
         from_square = data.get('from', '')
         to_square = data.get('to', '')
@@ -152,31 +236,52 @@ class ESP32Simulator:
         
         # Simular usuário executando movimento da IA
         print("ESP32: Simulando execução do movimento da IA...")
-        time.sleep(3)
+        await simulate_delay(3)
         
         message = CommunicationProtocol.create_message(
-            CommunicationProtocol.MESSAGE_TYPES['AI_MOVE_CONFIRMED'],
+            MSG_AI_MOVE_CONFIRMED,
             {'status': 'OK'}
         )
-        self.response_queue.put(message)
+        self.send_response(message)
         self.current_state = "WAITING_PLAYER_MOVE"
         print("ESP32: Movimento da IA confirmado. Sua vez!")
     
+    def send_response(self, message: str):
+        """Enfileira uma resposta e acorda quem a estiver aguardando"""
+        self.response_queue.put_nowait(message)
+    
     def get_response(self):
         """Obtém resposta da ESP32"""
         try:
             return self.response_queue.get_nowait()
-        except queue.Empty:
+        except asyncio.QueueEmpty:
+            return None
+    
+    async def wait_response(self, timeout: float):
+        """Aguarda a próxima resposta da ESP32 (None se não chegar a tempo)"""
+        try:
+            return await asyncio.wait_for(self.response_queue.get(), timeout)
+        except asyncio.TimeoutError:
             return None
 
 class RaspberryPiSimulator:
     """Simulador da Raspberry Pi para testes"""
     
+    __slots__ = ('board_manager', 'game_started', 'running', '_dispatch')
+    
     def __init__(self):
         self.board_manager = BoardStateManager()
         self.game_started = False
         self.running = False
         
+        # Manipuladores indexados pelo tipo da mensagem recebida
+        self._dispatch = {
+            MSG_GAME_START: lambda data: self.handle_game_start(),
+            MSG_PLAYER_MOVE: self.handle_player_move,
+            MSG_PLAYER_MOVE_COMPLETE: self.handle_player_move_complete,
+            MSG_AI_MOVE_CONFIRMED: lambda data: self.handle_ai_move_confirmed(),
+        }
+        
         print("Raspberry Pi Simulator inicializado")
     
     def start(self):
@@ -188,25 +293,21 @@ class RaspberryPiSimulator:
         """Para o simulador"""
         self.running = False
     
-    def process_message(self, message: str) -> str:
+    async def process_message(self, message: str) -> str:
         """Processa mensagem da ESP32 e retorna resposta"""
         data = CommunicationProtocol.parse_message(message)
         if not data:
             return ""
         
-        msg_type = data.get('type', '')
-        print(f"Raspberry Pi: Processando mensagem '{msg_type}'")
-        
-        if msg_type == 'game_start':
-            return self.handle_game_start()
-        elif msg_type == 'player_move':
-            return self.handle_player_move(data)
-        elif msg_type == 'player_move_complete':
-            return self.handle_player_move_complete(data)
-        elif msg_type == 'ai_move_confirmed':
-            return self.handle_ai_move_confirmed()
+        # Tipo ausente (None) ou desconhecido cai direto no descarte
+        msg_type = data.get('type')
+        handler = self._dispatch.get(msg_type)
+        if handler is None:
+            print(f"Raspberry Pi: Mensagem ignorada (tipo {msg_type!r})")
+            return ""
         
-        return ""
+        print(f"Raspberry Pi: Processando mensagem '{msg_type}'")
+        return handler(data)
     
     def handle_game_start(self) -> str:
         """Inicia novo jogo"""
@@ -216,8 +317,8 @@ class RaspberryPiSimulator:
         self.game_started = True
         
         # Enviar matriz inicial
-        matrix = self.board_manager.get_board_matrix()
-        return CommunicationProtocol.create_board_matrix_message(matrix)
+        occupied = self.board_manager.get_board_occupancy()
+        return CommunicationProtocol.create_board_matrix_message(occupied)
     
     def handle_player_move(self, data: Dict) -> str:
         """Processa origem do movimento do jogador"""
@@ -226,13 +327,9 @@ class RaspberryPiSimulator:
         print(f"Raspberry Pi: Calculando movimentos possíveis de {from_square}")
         
         # Simular cálculo de movimentos possíveis
-        possible_moves = ['e2e4', 'e2e3', 'd2d4', 'd2d3']  # Exemplo
-        best_move = possible_moves[0]
-        alternatives = possible_moves[1:3]
-        
         return CommunicationProtocol.create_move_options_message(
-            best_move.upper(), 
-            [move.upper() for move in alternatives]
+            EXAMPLE_BEST_MOVE,
+            EXAMPLE_ALTERNATIVES
         )
     
     def handle_player_move_complete(self, data: Dict) -> str:
@@ -244,20 +341,26 @@ class RaspberryPiSimulator:
         print(f"Raspberry Pi: Processando movimento {move_uci}")
         
         # Atualizar tabuleiro
+        previous = self.board_manager.get_board_occupancy()
         if self.board_manager.update_board(move_uci):
             print("Raspberry Pi: Movimento válido, calculando resposta da IA...")
+            occupied = self.board_manager.get_board_occupancy()
+            messages = [CommunicationProtocol.create_board_delta_message(previous, occupied)]
             
             # Simular movimento da IA
             ai_moves = ['e7e5', 'b8c6', 'g8f6']  # Exemplos
             ai_move = ai_moves[0]
             
             # Executar movimento da IA no tabuleiro
-            self.board_manager.update_board(ai_move)
+            if self.board_manager.update_board(ai_move):
+                previous, occupied = occupied, self.board_manager.get_board_occupancy()
+                messages.append(CommunicationProtocol.create_board_delta_message(previous, occupied))
             
             from_sq = ai_move[:2].upper()
             to_sq = ai_move[2:4].upper()
+            messages.append(CommunicationProtocol.create_ai_move_message(from_sq, to_sq))
             
-            return CommunicationProtocol.create_ai_move_message(from_sq, to_sq)
+            return CommunicationProtocol.create_batch(messages)
         else:
             print("Raspberry Pi: Movimento inválido!")
             return ""
@@ -276,7 +379,13 @@ class RaspberryPiSimulator:
 class CommunicationTester:
     """Testador da comunicação entre simuladores"""
     
+    __slots__ = ('loop', 'esp32', 'raspberry', 'running')
+    
     def __init__(self):
+        # Um único loop para toda a sessão: as filas asyncio ficam presas a ele
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        
         self.esp32 = ESP32Simulator()
         self.raspberry = RaspberryPiSimulator()
         self.running = False
@@ -297,15 +406,15 @@ class CommunicationTester:
                 choice = input("\nEscolha uma opção: ").strip()
                 
                 if choice == '1':
-                    self.test_game_start()
+                    self.loop.run_until_complete(self.test_game_start())
                 elif choice == '2':
                     square = input("Digite a casa de origem (ex: E2): ").strip().upper()
                     if square:
-                        self.test_player_move(square)
+                        self.loop.run_until_complete(self.test_player_move(square))
                 elif choice == '3':
                     self.show_board_status()
                 elif choice == '4':
-                    self.test_full_game_sequence()
+                    self.loop.run_until_complete(self.test_full_game_sequence())
                 elif choice == '0':
                     self.stop_test()
                 else:
@@ -323,7 +432,7 @@ class CommunicationTester:
         print("4. Teste sequência completa")
         print("0. Sair")
     
-    def test_game_start(self):
+    async def test_game_start(self):
         """Testa início de jogo"""
         print("\n--- Testando início de jogo ---")
         
@@ -333,11 +442,11 @@ class CommunicationTester:
         # Raspberry Pi responde
         esp_message = self.esp32.get_response()
         if esp_message:
-            rasp_response = self.raspberry.process_message(esp_message)
+            rasp_response = await self.raspberry.process_message(esp_message)
             if rasp_response:
-                self.esp32.receive_message(rasp_response)
+                await self.esp32.receive_message(rasp_response)
     
-    def test_player_move(self, from_square: str):
+    async def test_player_move(self, from_square: str):
         """Testa movimento do jogador"""
         print(f"\n--- Testando movimento do jogador de {from_square} ---")
         
@@ -345,45 +454,50 @@ class CommunicationTester:
         self.esp32.simulate_player_move(from_square)
         
         # Processar comunicação
-        self.process_communication_cycle()
+        await self.process_communication_cycle()
     
-    def test_full_game_sequence(self):
+    async def test_full_game_sequence(self):
         """Testa sequência completa de jogo"""
         print("\n--- Testando sequência completa ---")
         
         # Iniciar jogo
-        self.test_game_start()
-        time.sleep(1)
+        await self.test_game_start()
+        await simulate_delay(1)
         
         # Alguns movimentos de exemplo
         moves = ['E2', 'D2', 'G1']
+        test_player_move = self.test_player_move
         
         for move in moves:
             print(f"\n>>> Testando movimento: {move}")
-            self.test_player_move(move)
-            time.sleep(2)
+            await test_player_move(move)
+            await simulate_delay(2)
     
-    def process_communication_cycle(self):
+    async def process_communication_cycle(self):
         """Processa um ciclo completo de comunicação"""
         max_cycles = 5
         cycle = 0
         
+        # Métodos resolvidos uma vez fora do loop
+        wait_response = self.esp32.wait_response
+        receive_message = self.esp32.receive_message
+        process_message = self.raspberry.process_message
+        
+        # O loop acorda assim que a ESP32 enfileira uma resposta, sem espera fixa
         while cycle < max_cycles:
             # Verificar resposta da ESP32
-            esp_message = self.esp32.get_response()
-            if esp_message:
-                # Raspberry processa mensagem
-                rasp_response = self.raspberry.process_message(esp_message)
-                if rasp_response:
-                    # ESP32 recebe resposta
-                    self.esp32.receive_message(rasp_response)
-                    cycle += 1
-                else:
-                    break
-            else:
+            esp_message = await wait_response(RESPONSE_TIMEOUT)
+            if not esp_message:
+                break
+            
+            # Raspberry processa mensagem
+            rasp_response = await process_message(esp_message)
+            if not rasp_response:
                 break
             
-            time.sleep(0.5)
+            # ESP32 recebe resposta
+            await receive_message(rasp_response)
+            cycle += 1
     
     def show_board_status(self):
         """Mostra status atual do tabuleiro"""
@@ -415,6 +529,7 @@ def main():
         print("\nTeste interrompido pelo usuário")
     finally:
         tester.stop_test()
+        tester.loop.close()
 
 if __name__ == "__main__":
     main()
@@ -5,14 +5,93 @@ Testa o fluxo completo de comunicação entre ESP32 e Raspberry Pi
 """
 
 import json
+import random
 import time
 import sys
 import os
+import io
+from contextlib import redirect_stdout
+from functools import lru_cache, wraps
+from itertools import chain
 from typing import Dict, List
 
 # Adicionar diretório ao path
 sys.path.append(os.path.dirname(__file__))
 
+# orjson é opcional: quando instalado, (de)serializa as mensagens mais rápido
+try:
+    import orjson
+    
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+    
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
+# Gerador de ruído dos sensores simulados (criado uma única vez)
+_rng = random.Random()
+
+# Tabelas de notação (linha 0 = fileira 8, coluna 0 = coluna A), montadas uma vez
+POSITION_TO_NOTATION = [[chr(ord('A') + col) + str(8 - row) for col in range(8)] for row in range(8)]
+NOTATION_TO_POSITION = {
+    notation: (row, col)
+    for row, notations in enumerate(POSITION_TO_NOTATION)
+    for col, notation in enumerate(notations)
+}
+
+def notation_to_position(notation: str) -> tuple:
+    """Converte 'E4' em (linha, coluna)"""
+    return NOTATION_TO_POSITION[notation]
+
+def position_to_notation(row: int, col: int) -> str:
+    """Converte (linha, coluna) em 'E4'"""
+    return POSITION_TO_NOTATION[row][col]
+
+# Rótulo de cada LED (índice = linha * 8 + coluna), ex.: "LED 28 (E5)"
+LED_LABELS = [
+    f"LED {row * 8 + col:2d} ({notation})"
+    for row, notations in enumerate(POSITION_TO_NOTATION)
+    for col, notation in enumerate(notations)
+]
+
+# Casos do teste de notação em colunas paralelas: cantos A1/H1/A8/H8,
+# centro E4 e peão do rei D2
+NOTATION_CASES = ("A1", "H1", "A8", "H8", "E4", "D2")
+NOTATION_ROWS = (7, 7, 0, 0, 4, 6)
+NOTATION_COLS = (0, 7, 0, 7, 4, 3)
+
+# As 64 casas válidas, em maiúsculas
+VALID_SQUARES = frozenset(NOTATION_TO_POSITION)
+
+def is_valid_square(square: str) -> bool:
+    """Verifica se a casa (em maiúsculas, ex.: 'E2') existe no tabuleiro"""
+    return square in VALID_SQUARES
+
+@lru_cache(maxsize=4096)
+def _is_valid_move_upper(move: str) -> bool:
+    if len(move) != 4:
+        return False
+    return is_valid_square(move[:2]) and is_valid_square(move[2:4])
+
+def is_valid_move(move: str) -> bool:
+    """Verifica o formato de um movimento ('e2e4' e 'E2E4' compartilham o cache)"""
+    return _is_valid_move_upper(move.upper())
+
+def buffered_output(test):
+    """Acumula os prints do teste e escreve tudo no stdout de uma vez ao final"""
+    @wraps(test)
+    def wrapper(*args, **kwargs):
+        buf = io.StringIO()
+        try:
+            with redirect_stdout(buf):
+                return test(*args, **kwargs)
+        finally:
+            sys.stdout.write(buf.getvalue())
+    return wrapper
+
+@buffered_output
 def test_json_messages():
     """Testa se as mensagens JSON estão no formato correto"""
     print("🧪 Testando formato das mensagens JSON...")
@@ -29,7 +108,7 @@ def test_json_messages():
     rasp_messages = [
         {
             "type": "board_matrix",
-            "matrix": [1] * 16 + [0] * 32 + [1] * 16  # Posição inicial simplificada
+            "occ": "ffff00000000ffff"  # Posição inicial (bitboard de ocupação)
         },
         {
             "type": "move_options",
@@ -43,24 +122,22 @@ def test_json_messages():
         }
     ]
     
+    # Codificar cada mensagem (falha se houver dado não serializável)
     print("✅ Mensagens ESP32 → Raspberry:")
     for msg in esp_messages:
-        json_str = json.dumps(msg)
-        print(f"   {json_str}")
-        # Verificar se pode ser decodificado
-        decoded = json.loads(json_str)
-        assert decoded == msg, "Erro na codificação/decodificação"
+        print(f"   {json_dumps(msg)}")
     
     print("✅ Mensagens Raspberry → ESP32:")
     for msg in rasp_messages:
-        json_str = json.dumps(msg)
-        print(f"   {json_str}")
-        # Verificar se pode ser decodificado
-        decoded = json.loads(json_str)
-        assert decoded == msg, "Erro na codificação/decodificação"
+        print(f"   {json_dumps(msg)}")
+    
+    # Verificar a decodificação de todas as mensagens num único ida e volta
+    all_messages = esp_messages + rasp_messages
+    assert json_loads(json_dumps(all_messages)) == all_messages, "Erro na codificação/decodificação"
     
     print("✅ Todos os formatos JSON estão corretos!")
 
+@buffered_output
 def test_board_matrix():
     """Testa a geração da matriz do tabuleiro"""
     print("\n🧪 Testando matriz do tabuleiro...")
@@ -77,56 +154,47 @@ def test_board_matrix():
         [1, 1, 1, 1, 1, 1, 1, 1]   # Linha 1: Peças brancas
     ]
     
-    # Converter para array 1D (como enviado para ESP32)
-    flat_matrix = [cell for row in expected_matrix for cell in row]
+    # Empacotar em bitboard de 64 bits (bit 0 = A1, bit 63 = H8), como no protocolo
+    assert all(cell in (0, 1) for cell in chain.from_iterable(expected_matrix)), "Elementos devem ser 0 ou 1"
+    bitboard = 0
+    for row, cells in enumerate(expected_matrix):
+        for col, cell in enumerate(cells):
+            if cell:
+                bitboard |= 1 << ((7 - row) * 8 + col)
     
-    print(f"✅ Matriz 8x8 gerada com {len(flat_matrix)} elementos")
-    print(f"✅ Total de peças: {sum(flat_matrix)} (esperado: 32)")
+    # Quadro de 8 bytes enviado à ESP32 (fileira 8 primeiro)
+    frame = bitboard.to_bytes(8, 'big')
+    pieces = bin(bitboard).count('1')  # int.bit_count() exige Python 3.10+
+    
+    print(f"✅ Matriz 8x8 empacotada em {len(frame)} bytes: {frame.hex()}")
+    print(f"✅ Total de peças: {pieces} (esperado: 32)")
     
     # Verificar estrutura
-    assert len(flat_matrix) == 64, "Matriz deve ter 64 elementos"
-    assert sum(flat_matrix) == 32, "Deve haver 32 peças no início"
-    assert all(cell in [0, 1] for cell in flat_matrix), "Elementos devem ser 0 ou 1"
+    assert frame.hex() == "ffff00000000ffff", "Bitboard não corresponde à posição inicial"
+    assert pieces == 32, "Deve haver 32 peças no início"
     
     print("✅ Matriz do tabuleiro está correta!")
 
+@buffered_output
 def test_chess_notation():
     """Testa conversões de notação de xadrez"""
     print("\n🧪 Testando notações de xadrez...")
     
-    test_cases = [
-        ("A1", 7, 0),  # Canto inferior esquerdo
-        ("H1", 7, 7),  # Canto inferior direito  
-        ("A8", 0, 0),  # Canto superior esquerdo
-        ("H8", 0, 7),  # Canto superior direito
-        ("E4", 4, 4),  # Centro
-        ("D2", 6, 3),  # Peão do Rei
-    ]
+    # Teste: notação → posição, todos os casos de uma vez
+    positions = list(map(notation_to_position, NOTATION_CASES))
+    assert positions == list(zip(NOTATION_ROWS, NOTATION_COLS)), f"Erro em {positions}"
     
-    def notation_to_position(notation: str) -> tuple:
-        col = ord(notation[0]) - ord('A')
-        row = 8 - int(notation[1])
-        return (row, col)
-    
-    def position_to_notation(row: int, col: int) -> str:
-        file = chr(ord('A') + col)
-        rank = str(8 - row)
-        return file + rank
+    # Teste: posição → notação
+    notations = tuple(map(position_to_notation, NOTATION_ROWS, NOTATION_COLS))
+    assert notations == NOTATION_CASES, f"Erro na conversão reversa: {notations}"
     
     print("✅ Testando conversões:")
-    for notation, expected_row, expected_col in test_cases:
-        # Teste: notação → posição
-        row, col = notation_to_position(notation)
-        assert (row, col) == (expected_row, expected_col), f"Erro em {notation}"
-        
-        # Teste: posição → notação
-        converted_notation = position_to_notation(row, col)
-        assert converted_notation == notation, f"Erro na conversão reversa de {notation}"
-        
-        print(f"   {notation} ↔ ({row}, {col}) ✅")
+    print("\n".join(f"   {notation} ↔ ({row}, {col}) ✅"
+                    for notation, row, col in zip(NOTATION_CASES, NOTATION_ROWS, NOTATION_COLS)))
     
     print("✅ Todas as conversões estão corretas!")
 
+@buffered_output
 def test_move_validation():
     """Testa validação de movimentos"""
     print("\n🧪 Testando validação de movimentos...")
@@ -134,20 +202,6 @@ def test_move_validation():
     valid_moves = ["e2e4", "E2E4", "a1h8", "H7H8"]
     invalid_moves = ["e9e4", "z2z4", "e2", "e2e2e4", ""]
     
-    def is_valid_move(move: str) -> bool:
-        if len(move) != 4:
-            return False
-        
-        from_square = move[:2].upper()
-        to_square = move[2:4].upper()
-        
-        def is_valid_square(square: str) -> bool:
-            if len(square) != 2:
-                return False
-            return 'A' <= square[0] <= 'H' and '1' <= square[1] <= '8'
-        
-        return is_valid_square(from_square) and is_valid_square(to_square)
-    
     print("✅ Movimentos válidos:")
     for move in valid_moves:
         assert is_valid_move(move), f"Movimento {move} deveria ser válido"
@@ -160,6 +214,7 @@ def test_move_validation():
     
     print("✅ Validação de movimentos funcionando!")
 
+@buffered_output
 def test_led_colors():
     """Testa mapeamento de cores dos LEDs"""
     print("\n🧪 Testando cores dos LEDs...")
@@ -173,14 +228,13 @@ def test_led_colors():
         "off": "LED apagado"
     }
     
+    # Tabela formatada de uma vez e escrita numa única chamada
     print("✅ Mapeamento de cores:")
-    for color, description in color_mapping.items():
-        print(f"   {color:12} → {description}")
+    print("\n".join(f"   {color:12} → {description}" for color, description in color_mapping.items()))
     
     # Simular controle de LED
     def set_led_color(row: int, col: int, color: str) -> str:
-        led_index = row * 8 + col
-        return f"LED {led_index:2d} ({chr(ord('A')+col)}{8-row}) → {color.upper()}"
+        return f"{LED_LABELS[row * 8 + col]} → {color.upper()}"
     
     print("\n✅ Teste de controle de LEDs:")
     test_positions = [(0, 0), (0, 7), (7, 0), (7, 7), (3, 4)]
@@ -190,44 +244,38 @@ def test_led_colors():
     
     print("✅ Controle de LEDs funcionando!")
 
+@buffered_output
 def test_sensor_simulation():
     """Testa simulação de sensores Hall"""
     print("\n🧪 Testando simulação de sensores Hall...")
     
     SENSOR_THRESHOLD = 2000
     
-    def simulate_sensor(has_magnet: bool, noise_level: int = 100) -> int:
-        """Simula leitura de sensor Hall"""
-        import random
-        
-        if has_magnet:
-            # Ímã presente - valor alto
-            base_value = 3000
-            noise = random.randint(-noise_level, noise_level)
-            return max(0, min(4095, base_value + noise))
-        else:
-            # Sem ímã - valor baixo
-            base_value = 500
-            noise = random.randint(-noise_level, noise_level)
-            return max(0, min(4095, base_value + noise))
+    def simulate_sensors(has_magnet: List[bool], noise_level: int = 100) -> List[int]:
+        """Simula leituras de sensores Hall (ímã presente = ~3000, ausente = ~500)"""
+        # Sortear todo o ruído de uma vez em vez de um randint por leitura
+        noise = _rng.choices(range(-noise_level, noise_level + 1), k=len(has_magnet))
+        return [
+            max(0, min(4095, (3000 if magnet else 500) + n))
+            for magnet, n in zip(has_magnet, noise)
+        ]
     
     print("✅ Simulação de sensores:")
     print(f"   Threshold: {SENSOR_THRESHOLD}")
     
     # Testar com ímã
-    for i in range(5):
-        value = simulate_sensor(True)
+    for value in simulate_sensors([True] * 5):
         detected = value >= SENSOR_THRESHOLD
         print(f"   Com ímã:  {value:4d} → {'✅ Detectado' if detected else '❌ Não detectado'}")
     
     # Testar sem ímã
-    for i in range(5):
-        value = simulate_sensor(False)
+    for value in simulate_sensors([False] * 5):
         detected = value >= SENSOR_THRESHOLD
         print(f"   Sem ímã:  {value:4d} → {'❌ Detectado' if detected else '✅ Não detectado'}")
     
     print("✅ Simulação de sensores funcionando!")
 
+@buffered_output
 def test_game_states():
     """Testa estados do jogo"""
     print("\n🧪 Testando estados do jogo...")
@@ -250,10 +298,11 @@ def test_game_states():
         "VALIDATING_AI_MOVE": "Validando execução do movimento da IA"
     }
     
+    # Todo estado precisa ter descrição (KeyError falha o teste)
+    rows = [f"   {state:20} → {state_descriptions[state]}" for state in states]
+    
     print("✅ Estados do jogo:")
-    for state in states:
-        description = state_descriptions.get(state, "Descrição não encontrada")
-        print(f"   {state:20} → {description}")
+    print("\n".join(rows))
     
     print("✅ Estados do jogo bem definidos!")
 